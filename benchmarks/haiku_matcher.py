@@ -0,0 +1,88 @@
+"""Per-sentence cost of HaikuFinder.find_haiku on the sample articles.
+
+Compares the streaming matcher against the old approach of counting every
+term in the sentence up front, and checks that both find the same haiku.
+
+    python -m benchmarks.haiku_matcher [repeat]
+"""
+import os
+import sys
+import time
+import logging
+
+from nyt_haiku import nyt
+from nyt_haiku.haiku import HaikuFinder, is_special_punctuation
+from nyt_haiku.errors import SyllableCountError
+
+logger = logging.getLogger(__name__)
+
+SAMPLES_DIR = os.path.join(os.path.dirname(__file__), '..', 'tests', 'samples')
+SAMPLES = ['article.html', 'live_blog.html']
+
+
+def sample_sentences(haiku_finder):
+    sentences = []
+    for sample in SAMPLES:
+        with open(os.path.join(SAMPLES_DIR, sample)) as file:
+            meta, body = nyt.parse_article(logger, sample, file.read(), True)
+        sentences += haiku_finder.sentences_from_article(body)
+    return sentences
+
+
+def eager_find_haiku(haiku_finder, sentence_text):
+    '''The previous matcher: count every term, then consume lines from the front'''
+    try:
+        terms = haiku_finder.terms_from_sentence(sentence_text)
+    except SyllableCountError:
+        return None
+
+    lines = []
+    for max_syllables in [5, 7, 5]:
+        syllable_count = 0
+        line = []
+        while syllable_count < max_syllables:
+            if not terms:
+                return None
+            term, syllables = terms.pop(0)
+            if syllables == 0 and not is_special_punctuation(term):
+                return None
+            syllable_count += syllables
+            line.append(term)
+            if syllable_count > max_syllables:
+                return None
+        lines.append(' '.join(line))
+
+    if terms:
+        return None
+    return lines
+
+
+def time_per_sentence(haiku_finder, find, sentences, repeat, warm):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        if not warm:
+            haiku_finder.clear_syllable_cache()
+        for sentence in sentences:
+            find(sentence)
+    return (time.perf_counter() - start) / (repeat * len(sentences))
+
+
+def main(repeat=20):
+    haiku_finder = HaikuFinder()
+    sentences = sample_sentences(haiku_finder)
+
+    streaming = [haiku_finder.find_haiku(s) for s in sentences]
+    eager = [eager_find_haiku(haiku_finder, s) for s in sentences]
+    assert [h and h['lines'] for h in streaming] == eager, "matchers disagree"
+
+    print(f"{len(sentences)} sentences, {sum(1 for h in streaming if h)} haiku, {repeat} repeats")
+    for warm in [False, True]:
+        cache = 'warm' if warm else 'cold'
+        eager_cost = time_per_sentence(haiku_finder, lambda s: eager_find_haiku(haiku_finder, s), sentences, repeat, warm)
+        streaming_cost = time_per_sentence(haiku_finder, haiku_finder.find_haiku, sentences, repeat, warm)
+        print(f"eager      {cache} cache {eager_cost * 1e6:8.2f} us/sentence")
+        print(f"streaming  {cache} cache {streaming_cost * 1e6:8.2f} us/sentence")
+
+
+if __name__ == "__main__":
+    main(*[int(arg) for arg in sys.argv[1:2]])
@@ -0,0 +1,85 @@
+"""Side-by-side timing of nyt.parse_article backends on the sample pages.
+
+Times parse_article with each HTML_PARSERS backend, checking they all return
+the same metadata and body, and times paragraph text extraction on its own
+against the previous quadratic reduce(operator.concat, ...) version.
+
+    python -m benchmarks.parse_article [repeat]
+"""
+import os
+import sys
+import time
+import logging
+import operator
+from functools import reduce
+
+from bs4 import BeautifulSoup, NavigableString, FeatureNotFound
+
+from nyt_haiku import nyt
+
+logger = logging.getLogger(__name__)
+
+SAMPLES_DIR = os.path.join(os.path.dirname(__file__), '..', 'tests', 'samples')
+SAMPLES = ['article.html', 'live_blog.html']
+
+
+def article_paragraphs(html):
+    soup = BeautifulSoup(html, 'html.parser')
+    article = soup.find("article", {"id": "story"}) or soup.find("article", {"id": "interactive"})
+    if article:
+        return article.find_all('p')
+    return [p for post in soup.find_all("div", {"class": "live-blog-post"}) for p in post.find_all('p')]
+
+
+def legacy_paragraph_text(p_tags):
+    '''Paragraph text extraction as parse_article used to do it'''
+    p_contents = reduce(operator.concat, [p.contents + [NavigableString('\n')] for p in p_tags], [])
+    body_strings = []
+    for node in p_contents:
+        if type(node) is NavigableString:
+            body_strings.append(node)
+        elif node.name == 'br':
+            body_strings.append(' \n ')
+        else:
+            body_strings.append(node.get_text())
+    return ''.join(body_strings)
+
+
+def best_time(func, repeat):
+    '''Fastest of repeat calls, which is the least noisy estimate'''
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def main(repeat=10):
+    for sample in SAMPLES:
+        with open(os.path.join(SAMPLES_DIR, sample)) as file:
+            html = file.read()
+
+        print(f"{sample} ({len(html) // 1024} KB)")
+        reference = nyt.parse_article(logger, sample, html, True, html_parser=nyt.DEFAULT_HTML_PARSER)
+
+        for html_parser in nyt.HTML_PARSERS:
+            try:
+                result = nyt.parse_article(logger, sample, html, True, html_parser=html_parser)
+            except FeatureNotFound:
+                print(f"  {html_parser:22} not installed")
+                continue
+
+            same = 'same' if result == reference else 'DIFFERENT'
+            cost = best_time(lambda: nyt.parse_article(logger, sample, html, True, html_parser=html_parser), repeat)
+            print(f"  {html_parser:22} {cost * 1000:8.2f} ms  {same}")
+
+        p_tags = article_paragraphs(html)
+        assert legacy_paragraph_text(p_tags) == ''.join(nyt.paragraph_strings(p_tags))
+        legacy = best_time(lambda: legacy_paragraph_text(p_tags), repeat)
+        linear = best_time(lambda: ''.join(nyt.paragraph_strings(p_tags)), repeat)
+        print(f"  {len(p_tags)} paragraphs: legacy extraction {legacy * 1000:.2f} ms, linear {linear * 1000:.2f} ms")
+
+
+if __name__ == "__main__":
+    main(*[int(arg) for arg in sys.argv[1:2]])
@@ -0,0 +1,251 @@
+"""Stage by stage timing of the article pipeline, runnable offline.
+
+Times each stage on the sample articles and on a synthetic corpus shuffled
+together from their paragraphs:
+
+    parse       nyt.parse_article
+    sentences   HaikuFinder.sentences_from_article
+    syllables   HaikuFinder.terms_from_sentence, cold syllable cache
+    find_haiku  HaikuFinder.find_haiku, cold syllable cache
+    moderator   ArticleModerator term and awkwardness checks
+    db          nyt.save_new_urls and nyt.save_article into a temp SQLite file
+
+Each stage reports the best of several runs as articles/s and sentences/s,
+and its peak traced memory from a separate run under tracemalloc. Results can
+be saved as JSON and compared against a baseline from another commit:
+
+    python -m benchmarks.stages --save baseline.json
+    python -m benchmarks.stages --compare baseline.json
+"""
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import logging
+import argparse
+import platform
+import tempfile
+import subprocess
+import tracemalloc
+
+from bs4 import BeautifulSoup
+from tortoise import Tortoise
+
+from nyt_haiku import nyt, models
+from nyt_haiku.haiku import HaikuFinder
+from nyt_haiku.errors import SyllableCountError
+from nyt_haiku.hash_index import HaikuHashIndex
+from nyt_haiku.models import Article
+
+logger = logging.getLogger(__name__)
+
+SAMPLES_DIR = os.path.join(os.path.dirname(__file__), '..', 'tests', 'samples')
+SAMPLES = ['article.html', 'live_blog.html']
+
+SYNTHETIC_ARTICLES = 50
+PARAGRAPHS_PER_ARTICLE = 40
+SEED = 1234
+
+# Slower than the baseline by more than this fraction counts as a regression
+TOLERANCE = 0.10
+
+
+def read_samples():
+    samples = {}
+    for sample in SAMPLES:
+        with open(os.path.join(SAMPLES_DIR, sample)) as file:
+            samples[sample] = file.read()
+    return samples
+
+
+def synthetic_corpus(samples, count=SYNTHETIC_ARTICLES, paragraphs=PARAGRAPHS_PER_ARTICLE, seed=SEED):
+    '''Builds article pages from the sample metadata and a seeded shuffle of all their paragraphs'''
+    soup = BeautifulSoup(samples['article.html'], 'html.parser')
+    head = ''.join(str(tag) for tag in soup.find_all(['meta', 'title']))
+
+    p_tags = []
+    for html in samples.values():
+        p_tags += [str(p) for p in BeautifulSoup(html, 'html.parser').find_all('p')]
+
+    rng = random.Random(seed)
+    corpus = {}
+    for i in range(count):
+        body = ''.join(rng.choice(p_tags) for _ in range(paragraphs))
+        corpus[f'https://www.nytimes.com/2020/01/01/synthetic-{i}.html'] = f'<html><head>{head}</head><body><article id="story">{body}</article></body></html>'
+    return corpus
+
+
+class Corpus:
+    '''Article pages plus what each stage needs from the one before it'''
+
+    def __init__(self, name, pages, haiku_finder):
+        self.name = name
+        self.pages = pages
+        self.bodies = [nyt.parse_article(logger, url, html, True)[1] for url, html in pages.items()]
+        self.sentences = [s for body in self.bodies for s in haiku_finder.sentences_from_article(body)]
+        self.haikus = {url: haiku_finder.find_haikus_in_article(body) for url, body in zip(pages, self.bodies)}
+
+
+def run_parse(haiku_finder, corpus):
+    for url, html in corpus.pages.items():
+        nyt.parse_article(logger, url, html, True)
+
+
+def run_sentences(haiku_finder, corpus):
+    for body in corpus.bodies:
+        haiku_finder.sentences_from_article(body)
+
+
+def run_syllables(haiku_finder, corpus):
+    haiku_finder.clear_syllable_cache()
+    for sentence in corpus.sentences:
+        try:
+            haiku_finder.terms_from_sentence(sentence)
+        except SyllableCountError:
+            pass
+
+
+def run_find_haiku(haiku_finder, corpus):
+    haiku_finder.clear_syllable_cache()
+    for sentence in corpus.sentences:
+        haiku_finder.find_haiku(sentence)
+
+
+def run_moderator(haiku_finder, corpus):
+    moderator = nyt.article_moderator()
+    for sentence in corpus.sentences:
+        moderator.contains_sensitive_term(sentence)
+        moderator.is_awkward(sentence)
+
+
+async def write_corpus(path, haikus):
+    await models.init(path)
+    try:
+        await nyt.save_new_urls(logger, haikus)
+        hash_index = HaikuHashIndex()
+        for article in await Article.filter(url__in=list(haikus)):
+            await nyt.save_article(logger, hash_index, article, haikus[article.url])
+    finally:
+        await Tortoise.close_connections()
+
+
+def run_db(haiku_finder, corpus):
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        asyncio.run(write_corpus(os.path.join(tmp_dir, 'bench.db'), corpus.haikus))
+
+
+STAGES = {
+    'parse': run_parse,
+    'sentences': run_sentences,
+    'syllables': run_syllables,
+    'find_haiku': run_find_haiku,
+    'moderator': run_moderator,
+    'db': run_db,
+}
+
+
+def best_time(func, repeat):
+    '''Fastest of repeat calls, which is the least noisy estimate'''
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def peak_memory(func):
+    tracemalloc.start()
+    try:
+        func()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def measure(haiku_finder, corpus, repeat):
+    results = {}
+    for stage, run in STAGES.items():
+        seconds = best_time(lambda: run(haiku_finder, corpus), repeat)
+        results[stage] = {
+            'seconds': seconds,
+            'articles_per_s': len(corpus.pages) / seconds,
+            'sentences_per_s': len(corpus.sentences) / seconds,
+            'peak_kb': peak_memory(lambda: run(haiku_finder, corpus)) // 1024,
+        }
+    return results
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_results(corpus, results, baseline=None):
+    print(f"{corpus.name}: {len(corpus.pages)} articles, {len(corpus.sentences)} sentences")
+    regressions = []
+    for stage, result in results.items():
+        line = f"  {stage:11} {result['seconds'] * 1000:9.2f} ms {result['articles_per_s']:9.1f} articles/s {result['sentences_per_s']:10.1f} sentences/s {result['peak_kb']:7} KB peak"
+
+        previous = baseline and baseline.get(corpus.name, {}).get(stage)
+        if previous:
+            change = result['seconds'] / previous['seconds'] - 1
+            line += f"  {change:+7.1%}"
+            if change > TOLERANCE:
+                line += " SLOWER"
+                regressions.append(f"{corpus.name} {stage}")
+        print(line)
+    return regressions
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    arg_parser.add_argument('--repeat', type=int, default=5)
+    arg_parser.add_argument('--articles', type=int, default=SYNTHETIC_ARTICLES, help='synthetic corpus size')
+    arg_parser.add_argument('--segmenter', default='full')
+    arg_parser.add_argument('--save', metavar='PATH', help='write results as JSON')
+    arg_parser.add_argument('--compare', metavar='PATH', help='compare with results saved by --save')
+    args = arg_parser.parse_args()
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as file:
+            baseline = json.load(file)
+        print(f"comparing with {args.compare} from commit {baseline.get('commit')}")
+
+    haiku_finder = HaikuFinder(segmenter=args.segmenter)
+    samples = read_samples()
+    corpora = [Corpus(sample, {sample: html}, haiku_finder) for sample, html in samples.items()]
+    corpora.append(Corpus('synthetic', synthetic_corpus(samples, args.articles), haiku_finder))
+
+    report = {
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'segmenter': args.segmenter,
+        'repeat': args.repeat,
+        'corpora': {},
+    }
+
+    regressions = []
+    for corpus in corpora:
+        results = measure(haiku_finder, corpus, args.repeat)
+        report['corpora'][corpus.name] = results
+        regressions += print_results(corpus, results, baseline and baseline['corpora'])
+
+    if args.save:
+        with open(args.save, 'w') as file:
+            json.dump(report, file, indent=2)
+        print(f"saved to {args.save}")
+
+    if regressions:
+        print(f"{len(regressions)} stages more than {TOLERANCE:.0%} slower: {', '.join(regressions)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
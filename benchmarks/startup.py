@@ -0,0 +1,63 @@
+"""Startup cost of the bot's modules and the objects they build on first use.
+
+Imports each module in a fresh interpreter with -X importtime and reports the
+total along with the packages that took longest, then times building the
+shared moderator and a HaikuFinder for each segmenter.
+
+    python -m benchmarks.startup [top]
+"""
+import sys
+import time
+import subprocess
+from collections import Counter
+
+# What each entry point imports from the package
+MODULES = [
+    'nyt_haiku.models',     # publish.py, setup.py, twitter_stats.py
+    'nyt_haiku.twitter',
+    'nyt_haiku.nyt',
+    'nyt_haiku.workers',    # main.py, reprocess.py
+]
+
+
+def import_times(module):
+    '''Returns the total microseconds to import module and the self time of each top-level package'''
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                            capture_output=True, text=True, check=True)
+
+    total = 0
+    packages = Counter()
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'imported package' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        packages[name.strip().split('.')[0]] += int(self_us)
+        if name.strip() == module:
+            total = int(cumulative_us)
+    return total, packages
+
+
+def first_use(label, func):
+    start = time.perf_counter()
+    func()
+    print(f"  {label:28} {(time.perf_counter() - start) * 1000:8.1f} ms")
+
+
+def main(top=5):
+    print("imports, each in a new interpreter")
+    for module in MODULES:
+        total, packages = import_times(module)
+        heaviest = ', '.join(f"{name} {us / 1000:.0f}" for name, us in packages.most_common(top))
+        print(f"  {module:20} {total / 1000:8.1f} ms  ({heaviest})")
+
+    from nyt_haiku import nyt
+    from nyt_haiku.haiku import HaikuFinder, SEGMENTERS
+
+    print("first use")
+    first_use('nyt.article_moderator()', nyt.article_moderator)
+    for segmenter in SEGMENTERS:
+        first_use(f"HaikuFinder('{segmenter}')", lambda: HaikuFinder(segmenter=segmenter))
+
+
+if __name__ == "__main__":
+    main(*[int(arg) for arg in sys.argv[1:2]])
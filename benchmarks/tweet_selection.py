@@ -0,0 +1,89 @@
+"""Time to pick the next haiku to tweet on a large synthetic database.
+
+Compares the old ORDER BY RANDOM() query with candidates.next_candidate,
+which looks up random slots in the tweet_candidate table.
+
+    python -m benchmarks.tweet_selection [haiku] [repeat]
+"""
+import os
+import sys
+import time
+import random
+import asyncio
+import sqlite3
+import tempfile
+from datetime import datetime, timedelta
+
+from tortoise import Tortoise
+
+from nyt_haiku import models, candidates
+
+# How twitter.tweet picked a haiku before the candidate table
+ORDER_BY_RANDOM_QUERY = "select id from haiku where tweet_id IS NULL AND article_id NOT IN (select article_id from haiku where tweet_id IS NOT NULL and tweeted_at > datetime('now','-2 hour')) ORDER BY RANDOM() limit 1"
+
+HAIKU_PER_ARTICLE = 5
+TWEETED_FRACTION = 0.05
+SEED = 1234
+
+
+def fill(path, haiku_count):
+    '''Inserts haiku_count haiku straight into SQLite, a few percent of them tweeted over the last year'''
+    rng = random.Random(SEED)
+    now = datetime.utcnow()
+    article_count = haiku_count // HAIKU_PER_ARTICLE + 1
+
+    db = sqlite3.connect(path)
+    with db:
+        db.executemany("INSERT INTO article (id, url, parsed, sensitive) VALUES (?, ?, 1, 0)",
+                       ((i, f'https://www.nytimes.com/{i}.html') for i in range(1, article_count + 1)))
+
+        def haiku_rows():
+            for i in range(1, haiku_count + 1):
+                tweeted = rng.random() < TWEETED_FRACTION
+                tweeted_at = (now - timedelta(minutes=rng.randrange(365 * 24 * 60))).isoformat(' ') if tweeted else None
+                yield (i, f'{i:032x}', i // HAIKU_PER_ARTICLE + 1, 'sentence', 'line0', 'line1', 'line2',
+                       str(i) if tweeted else None, tweeted_at)
+
+        db.executemany("INSERT INTO haiku (id, hash, article_id, sentence, line0, line1, line2, tweet_id, tweeted_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                       haiku_rows())
+    db.close()
+
+
+async def time_picks(conn, pick, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        await pick(conn)
+    return (time.perf_counter() - start) / repeat
+
+
+async def order_by_random(conn):
+    return await conn.execute_query_dict(ORDER_BY_RANDOM_QUERY)
+
+
+async def run(path, haiku_count, repeat):
+    await models.init(path)
+    await Tortoise.close_connections()
+
+    start = time.perf_counter()
+    fill(path, haiku_count)
+    print(f"{haiku_count} haiku inserted in {time.perf_counter() - start:.1f}s, candidate table kept by triggers")
+
+    await models.init(path)
+    conn = Tortoise.get_connection("default")
+    rows = await conn.execute_query_dict(candidates.POOL_SIZE_QUERY)
+    print(f"{rows[0]['size']} candidates")
+
+    old = await time_picks(conn, order_by_random, max(repeat // 10, 1))
+    new = await time_picks(conn, candidates.next_candidate, repeat)
+    print(f"ORDER BY RANDOM()  {old * 1000:9.3f} ms/pick")
+    print(f"next_candidate     {new * 1000:9.3f} ms/pick  ({old / new:.0f}x)")
+    await Tortoise.close_connections()
+
+
+def main(haiku_count=1000000, repeat=100):
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        asyncio.run(run(os.path.join(tmp_dir, 'bench.db'), haiku_count, repeat))
+
+
+if __name__ == "__main__":
+    main(*[int(arg) for arg in sys.argv[1:3]])
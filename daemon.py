@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""Runs the bot continuously instead of once per cron invocation.
+
+Section checks, article fetches and tweets each run on their own schedule
+(SECTIONS_INTERVAL, ARTICLES_INTERVAL and TWEET_INTERVAL, in seconds), sharing
+one database connection, HTTP session and warm haiku finder. SIGTERM or SIGINT
+stops it once the running job finishes. With STATUS_PATH set, the state of
+each job and its last run's timings are kept in that JSON file.
+"""
+import os
+import signal
+
+import asyncio
+import aiohttp
+import logging
+import logging.config
+from dotenv import load_dotenv
+from nyt_haiku import models, nyt, twitter, workers
+from nyt_haiku.daemon import Daemon, Job
+from nyt_haiku.hash_index import HaikuHashIndex
+from nyt_haiku.section_cache import SectionCache
+from nyt_haiku.archive import ArticleArchive
+
+load_dotenv()
+
+logger = logging.getLogger()
+logging.config.fileConfig('logconfig.ini')
+
+SECTIONS_INTERVAL = 15 * 60
+ARTICLES_INTERVAL = 5 * 60
+TWEET_INTERVAL = 60 * 60
+
+
+async def main():
+    article_processor = workers.article_processor(logger,
+                                                  workers.pool_size(os.getenv("ARTICLE_WORKERS")),
+                                                  segmenter=os.getenv("HAIKU_SEGMENTER", "full"),
+                                                  html_parser=os.getenv("HTML_PARSER", nyt.DEFAULT_HTML_PARSER),
+                                                  prefilter=os.getenv("HAIKU_PREFILTER") == 'true')
+    try:
+        await models.init(os.getenv("DB_PATH"))
+        hash_index = await HaikuHashIndex.load()
+        section_cache = SectionCache(os.getenv("SECTION_CACHE_PATH")) if os.getenv("SECTION_CACHE_PATH") else None
+        archive = ArticleArchive(os.getenv("ARCHIVE_PATH")) if os.getenv("ARCHIVE_PATH") else None
+
+        connector = aiohttp.TCPConnector(limit_per_host=15)
+        async with aiohttp.ClientSession(connector=connector) as session:
+            async def check_sections(metrics):
+                await nyt.check_sections(session, logger, section_cache, metrics)
+
+            async def fetch_articles(metrics):
+                await nyt.fetch_articles(session, logger, article_processor,
+                                         hash_index=hash_index,
+                                         concurrency=int(os.getenv("ARTICLE_CONCURRENCY", nyt.ARTICLE_CONCURRENCY)),
+                                         batch_size=int(os.getenv("ARTICLE_BATCH_SIZE", nyt.ARTICLE_BATCH_SIZE)),
+                                         max_articles=int(os.getenv("MAX_ARTICLES_PER_RUN")) if os.getenv("MAX_ARTICLES_PER_RUN") else None,
+                                         max_bytes=int(os.getenv("MAX_ARTICLE_BYTES", nyt.MAX_ARTICLE_BYTES)),
+                                         metrics=metrics,
+                                         archive=archive)
+
+            async def tweet(metrics):
+                await twitter.tweet(session, logger, metrics)
+
+            jobs = [Job('sections', int(os.getenv("SECTIONS_INTERVAL", SECTIONS_INTERVAL)), check_sections),
+                    Job('articles', int(os.getenv("ARTICLES_INTERVAL", ARTICLES_INTERVAL)), fetch_articles)]
+            if os.getenv("DISABLE_TWITTER") != 'true':
+                jobs.append(Job('tweet', int(os.getenv("TWEET_INTERVAL", TWEET_INTERVAL)), tweet))
+
+            daemon = Daemon(logger, jobs, os.getenv("STATUS_PATH"))
+            loop = asyncio.get_running_loop()
+            for signum in (signal.SIGTERM, signal.SIGINT):
+                loop.add_signal_handler(signum, daemon.stop)
+
+            await daemon.run()
+    finally:
+        article_processor.close()
+        await models.close_db()
+
+asyncio.run(main())
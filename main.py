@@ -6,8 +6,10 @@ import aiohttp
 import logging
 import logging.config
 from dotenv import load_dotenv
-from nyt_haiku import models, nyt, twitter
-from nyt_haiku.haiku import HaikuFinder
+from nyt_haiku import models, nyt, twitter, workers
+from nyt_haiku.metrics import Metrics, LoopLagMonitor
+from nyt_haiku.section_cache import SectionCache
+from nyt_haiku.archive import ArticleArchive
 
 load_dotenv()
 
@@ -17,18 +19,41 @@ logging.config.fileConfig('logconfig.ini')
 
 async def main():
     logger.info("Starting run...")
+    metrics = Metrics()
+    lag_monitor = LoopLagMonitor(logger, metrics)
+    lag_monitor.start()
     db_path = os.getenv("DB_PATH")
-    haiku_finder = HaikuFinder()
-    await models.init(db_path)
-
-    connector = aiohttp.TCPConnector(limit_per_host=15)
-    async with aiohttp.ClientSession(connector=connector) as session:
-        await nyt.check_sections(session, logger)
-        await nyt.fetch_articles(session, logger, haiku_finder)
-        if os.getenv("DISABLE_TWITTER") != 'true':
-            await twitter.tweet(session, logger)
-
-    await models.close_db()
+    article_processor = workers.article_processor(logger,
+                                                  workers.pool_size(os.getenv("ARTICLE_WORKERS")),
+                                                  segmenter=os.getenv("HAIKU_SEGMENTER", "full"),
+                                                  html_parser=os.getenv("HTML_PARSER", nyt.DEFAULT_HTML_PARSER),
+                                                  prefilter=os.getenv("HAIKU_PREFILTER") == 'true')
+    try:
+        await models.init(db_path)
+
+        connector = aiohttp.TCPConnector(limit_per_host=15)
+        async with aiohttp.ClientSession(connector=connector) as session:
+            section_cache = SectionCache(os.getenv("SECTION_CACHE_PATH")) if os.getenv("SECTION_CACHE_PATH") else None
+            archive = ArticleArchive(os.getenv("ARCHIVE_PATH")) if os.getenv("ARCHIVE_PATH") else None
+            await nyt.check_sections(session, logger, section_cache, metrics)
+            await nyt.fetch_articles(session, logger, article_processor,
+                                     concurrency=int(os.getenv("ARTICLE_CONCURRENCY", nyt.ARTICLE_CONCURRENCY)),
+                                     batch_size=int(os.getenv("ARTICLE_BATCH_SIZE", nyt.ARTICLE_BATCH_SIZE)),
+                                     max_articles=int(os.getenv("MAX_ARTICLES_PER_RUN")) if os.getenv("MAX_ARTICLES_PER_RUN") else None,
+                                     max_bytes=int(os.getenv("MAX_ARTICLE_BYTES", nyt.MAX_ARTICLE_BYTES)),
+                                     metrics=metrics,
+                                     archive=archive)
+            if os.getenv("DISABLE_TWITTER") != 'true':
+                await twitter.tweet(session, logger, metrics)
+    finally:
+        article_processor.close()
+        await models.close_db()
+        await lag_monitor.stop()
+
+    for line in metrics.summary():
+        logger.info(f"METRICS {line}")
+    if os.getenv("METRICS_PATH"):
+        metrics.export(os.getenv("METRICS_PATH"), os.getenv("METRICS_FORMAT", "json"))
     logger.info("Ending run...")
 
 asyncio.run(main())
@@ -0,0 +1,99 @@
+import os
+import gzip
+import json
+import threading
+
+from tortoise import timezone
+
+from nyt_haiku.models import Haiku
+from nyt_haiku.section_cache import content_digest
+
+INDEX_FILE = 'index.jsonl'
+OBJECTS_DIR = 'objects'
+
+
+class ArticleArchive:
+    '''Append-only store of fetched article HTML, so haiku can be found again
+    after the syllable counts or moderation rules change.
+
+    Each page is gzipped under the SHA-1 of its HTML, so an article fetched
+    twice unchanged is stored once. index.jsonl records every (url, digest)
+    pair in the order they were first seen, the latest one for a URL wins.
+    add() may be called from several threads at once.'''
+
+    def __init__(self, path: str):
+        self.path = path
+        self.index_path = os.path.join(path, INDEX_FILE)
+        self.indexed = None
+        self.lock = threading.Lock()
+
+    def object_path(self, digest: str) -> str:
+        return os.path.join(self.path, OBJECTS_DIR, digest[:2], f"{digest}.html.gz")
+
+    def read_index(self):
+        '''Yields the index records in the order they were written'''
+        if not os.path.exists(self.index_path):
+            return
+
+        with open(self.index_path) as file:
+            for line in file:
+                # A run killed mid-write can leave a partial last line
+                if line.endswith('\n'):
+                    yield json.loads(line)
+
+    def entries(self) -> dict:
+        '''Returns the latest digest archived for each URL'''
+        return {record['url']: record['digest'] for record in self.read_index()}
+
+    def add(self, url: str, html: str) -> str:
+        '''Archives a page unless it is already stored, returning its digest'''
+        with self.lock:
+            if self.indexed is None:
+                self.indexed = set((record['url'], record['digest']) for record in self.read_index())
+
+            digest = content_digest(html)
+            path = self.object_path(digest)
+            if not os.path.exists(path):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                tmp_path = f"{path}.tmp"
+                with gzip.open(tmp_path, 'wt', encoding='utf-8') as file:
+                    file.write(html)
+                os.replace(tmp_path, path)
+
+            if (url, digest) not in self.indexed:
+                self.indexed.add((url, digest))
+                with open(self.index_path, 'a') as file:
+                    file.write(json.dumps({'url': url, 'digest': digest, 'archived_at': timezone.now().isoformat()}) + '\n')
+
+            return digest
+
+    def read(self, digest: str) -> str:
+        with gzip.open(self.object_path(digest), 'rt', encoding='utf-8') as file:
+            return file.read()
+
+
+async def saved_haikus(urls, hashes, chunk_size: int = 500) -> dict:
+    '''Returns hash -> (url, lines) for the haiku saved from the given articles,
+    plus any of the given hashes saved from other articles'''
+    saved = {}
+    fields = ('hash', 'article__url', 'line0', 'line1', 'line2')
+
+    for filter_name, values in (('article__url__in', list(urls)), ('hash__in', list(hashes))):
+        for i in range(0, len(values), chunk_size):
+            rows = await Haiku.filter(**{filter_name: values[i:i + chunk_size]}).values_list(*fields)
+            for hash, url, line0, line1, line2 in rows:
+                saved[hash] = (url, [line0, line1, line2])
+
+    return saved
+
+
+def diff_haikus(saved: dict, found: dict) -> dict:
+    '''Compares saved and newly found haiku, both hash -> (url, lines).
+
+    A haiku is keyed by its sentence, so "changed" means the same sentence is
+    now split into different lines.'''
+    return {
+        'new': sorted(hash for hash in found if hash not in saved),
+        'removed': sorted(hash for hash in saved if hash not in found),
+        'changed': sorted(hash for hash in found if hash in saved and found[hash][1] != saved[hash][1]),
+    }
@@ -0,0 +1,56 @@
+import random
+
+# Untweeted haiku live in the tweet_candidate table under slots numbered 1..N,
+# kept dense by triggers on the haiku table (see migrations). Picking a random
+# slot and looking it up replaces ORDER BY RANDOM() over every untweeted haiku.
+
+# Haiku from an article tweeted in the last COOLDOWN_HOURS are not picked
+COOLDOWN_HOURS = 2
+
+# Random slots tried before falling back to a query over the whole pool, which
+# only happens when nearly every candidate is cooling down or weighted out
+PICK_ATTEMPTS = 50
+
+POOL_SIZE_QUERY = 'SELECT IFNULL(MAX("slot"), 0) AS "size" FROM "tweet_candidate"'
+CANDIDATE_QUERY = 'SELECT "slot", "haiku_id", "article_id" FROM "tweet_candidate" WHERE "slot" = ?'
+# Without DISTINCT, which makes SQLite walk the whole article_id index instead of the tweeted_at one
+COOLDOWN_QUERY = "SELECT article_id FROM haiku WHERE tweeted_at > datetime('now', ?)"
+FALLBACK_QUERY = 'SELECT "slot", "haiku_id", "article_id" FROM "tweet_candidate" WHERE "article_id" NOT IN ({}) ORDER BY RANDOM() LIMIT 1'
+
+
+def uniform(candidate) -> float:
+    return 1.0
+
+
+async def cooling_down(conn, hours:int=COOLDOWN_HOURS) -> set:
+    '''IDs of the articles with a haiku tweeted in the last hours'''
+    rows = await conn.execute_query_dict(COOLDOWN_QUERY, [f'-{hours} hour'])
+    return set(row["article_id"] for row in rows)
+
+
+async def next_candidate(conn, rng=random, weight=uniform, cooldown_hours:int=COOLDOWN_HOURS, attempts:int=PICK_ATTEMPTS):
+    '''Returns the id of a random untweeted haiku from an article not cooling down, or None.
+
+    Candidates are drawn uniformly and kept with probability weight(candidate),
+    a dict of slot, haiku_id and article_id, so the default is a uniform pick.
+    Each draw is one primary key lookup.'''
+    rows = await conn.execute_query_dict(POOL_SIZE_QUERY)
+    size = rows[0]["size"]
+    if not size:
+        return None
+
+    excluded = await cooling_down(conn, cooldown_hours)
+
+    for _ in range(attempts):
+        rows = await conn.execute_query_dict(CANDIDATE_QUERY, [rng.randint(1, size)])
+        if not rows:
+            continue
+
+        candidate = rows[0]
+        if candidate["article_id"] not in excluded and rng.random() < weight(candidate):
+            return candidate["haiku_id"]
+
+    # NOT IN () matches everything, which is what no exclusions should do
+    placeholders = ', '.join('?' for _ in excluded)
+    rows = await conn.execute_query_dict(FALLBACK_QUERY.format(placeholders), list(excluded))
+    return rows[0]["haiku_id"] if rows else None
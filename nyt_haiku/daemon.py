@@ -0,0 +1,118 @@
+import os
+import json
+import time
+import asyncio
+
+from nyt_haiku.metrics import Metrics, LoopLagMonitor
+
+
+class Job:
+    '''A task the daemon runs every interval seconds, given fresh Metrics each time'''
+
+    def __init__(self, name: str, interval: float, run):
+        self.name = name
+        self.interval = interval
+        self.run = run
+        self.next_run = 0
+        self.runs = 0
+        self.errors = 0
+        self.last = None
+
+    def status(self) -> dict:
+        return {
+            'interval': self.interval,
+            'next_run': self.next_run,
+            'runs': self.runs,
+            'errors': self.errors,
+            'last': self.last,
+        }
+
+
+class Daemon:
+    '''Runs jobs on their own schedules until stopped, one at a time.
+
+    Jobs share whatever state they close over (database, HTTP session, haiku
+    finder) across runs. stop() lets the running job finish, so it is safe to
+    call from a SIGTERM handler. After each job the status of every job,
+    including the last run's timings, is written to status_path as JSON.'''
+
+    def __init__(self, logger, jobs, status_path=None):
+        self.logger = logger
+        self.jobs = jobs
+        self.status_path = status_path
+        self.started_at = time.time()
+        self.stopping = asyncio.Event()
+        self.current = None
+
+    def stop(self):
+        if not self.stopping.is_set():
+            self.logger.info("DAEMON stopping after the current job...")
+        self.stopping.set()
+
+    async def run(self):
+        self.logger.info(f"DAEMON start, jobs: {', '.join(f'{job.name} every {job.interval}s' for job in self.jobs)}")
+        self.write_status()
+
+        while not self.stopping.is_set():
+            job = min(self.jobs, key=lambda job: job.next_run)
+            delay = job.next_run - time.time()
+            if delay > 0:
+                try:
+                    await asyncio.wait_for(self.stopping.wait(), delay)
+                    break
+                except asyncio.TimeoutError:
+                    pass
+
+            await self.run_job(job)
+
+        self.write_status()
+        self.logger.info("DAEMON stopped")
+
+    async def run_job(self, job: Job):
+        metrics = Metrics()
+        lag_monitor = LoopLagMonitor(self.logger, metrics)
+        lag_monitor.start()
+
+        self.current = job.name
+        self.write_status()
+        started_at = time.time()
+        error = None
+        try:
+            await job.run(metrics)
+        except Exception as err:
+            job.errors += 1
+            error = repr(err)
+            self.logger.info(f"ERROR   {job.name} {err!r}")
+        finally:
+            await lag_monitor.stop()
+            self.current = None
+
+        job.runs += 1
+        job.next_run = started_at + job.interval
+        job.last = {
+            'started_at': started_at,
+            'seconds': time.time() - started_at,
+            'error': error,
+            'metrics': metrics.as_dict(),
+        }
+        self.logger.info(f"DAEMON {job.name} done in {job.last['seconds']:.1f}s")
+        self.write_status()
+
+    def status(self) -> dict:
+        return {
+            'pid': os.getpid(),
+            'started_at': self.started_at,
+            'updated_at': time.time(),
+            'stopping': self.stopping.is_set(),
+            'running': self.current,
+            'jobs': {job.name: job.status() for job in self.jobs},
+        }
+
+    def write_status(self):
+        if not self.status_path:
+            return
+
+        tmp_path = f"{self.status_path}.tmp"
+        with open(tmp_path, 'w') as file:
+            json.dump(self.status(), file, indent=2)
+        os.replace(tmp_path, self.status_path)
@@ -9,3 +9,7 @@ class LineMismatchError(Error):
 
 class SyllableCountError(Error):
     pass
+
+
+class ArticleTooLargeError(Error):
+    pass
@@ -0,0 +1,65 @@
+import io
+import os
+import csv
+import gzip
+
+CSV_HEADERS = ['id', 'tweet_id', 'tweeted_at', 'line0', 'line1', 'line2', 'tweet_url', 'favorite_count', 'retweet_count', 'quote_count', 'nyt_url', 'nyt_title', 'byline', 'published_at', 'section', 'tags']
+TWEET_URL = "https://twitter.com/nythaikus/status/{}"
+
+TWEETED_HAIKU_QUERY = 'SELECT h.id, h.tweet_id, h.tweeted_at, h.line0, h.line1, h.line2, h.favorite_count, h.retweet_count, h.quote_count, a.url, a.title, a.byline, a.published_at, a.section, a.tags FROM haiku h JOIN article a ON a.id = h.article_id WHERE h.tweet_id IS NOT NULL ORDER BY h.id'
+
+# Rows fetched from the cursor at a time, and bytes buffered before each write
+CHUNK_SIZE = 1000
+BUFFER_SIZE = 1024 * 1024
+
+
+async def tweeted_haiku_rows(conn, chunk_size: int = CHUNK_SIZE):
+    '''Yields the tweeted haiku joined with their articles, chunk_size rows at a time, from one cursor'''
+    async with conn.acquire_connection() as connection:
+        async with connection.execute(TWEETED_HAIKU_QUERY) as cursor:
+            while True:
+                rows = await cursor.fetchmany(chunk_size)
+                if not rows:
+                    return
+                yield rows
+
+
+def csv_row(row) -> list:
+    (haiku_id, tweet_id, tweeted_at, line0, line1, line2, favorite_count, retweet_count, quote_count,
+     url, title, byline, published_at, section, tags) = row
+    return [haiku_id, tweet_id, tweeted_at, line0, line1, line2, TWEET_URL.format(tweet_id),
+            favorite_count, retweet_count, quote_count, url, title, byline, published_at, section, tags]
+
+
+def open_output(path: str, compress: bool):
+    if compress:
+        # mtime=0 so the same rows always compress to the same bytes
+        raw = gzip.GzipFile(path, 'wb', mtime=0)
+        return io.TextIOWrapper(io.BufferedWriter(raw, BUFFER_SIZE), encoding='utf-8', newline='')
+    return open(path, 'w', encoding='utf-8', newline='', buffering=BUFFER_SIZE)
+
+
+async def export_csv(conn, path: str, compress=None, chunk_size: int = CHUNK_SIZE) -> int:
+    '''Writes every tweeted haiku to a CSV at path, gzipped if compress or path ends in .gz, returning the row count.
+
+    Rows stream from the database a chunk at a time into a temporary file
+    that replaces path once complete, so readers never see a partial file.'''
+    if compress is None:
+        compress = path.endswith('.gz')
+
+    tmp_path = f"{path}.tmp"
+    count = 0
+    try:
+        with open_output(tmp_path, compress) as file:
+            writer = csv.writer(file)
+            writer.writerow(CSV_HEADERS)
+            async for rows in tweeted_haiku_rows(conn, chunk_size):
+                writer.writerows(csv_row(row) for row in rows)
+                count += len(rows)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+    return count
@@ -1,20 +1,39 @@
 import re
-import os
-import csv
-import spacy
-import syllapy
 import hashlib
-from num2words import num2words
 from unidecode import unidecode
 from string import punctuation
 
-from functools import reduce
-import operator
+from functools import lru_cache
 
+from nyt_haiku import syllable_dict
 from nyt_haiku.errors import LineMismatchError, SyllableCountError
 
 SPECIAL_PUNCTUATION_BREAKS = ['-', '—']
 
+HAIKU_LINE_SYLLABLES = [5, 7, 5]
+HAIKU_SYLLABLES = sum(HAIKU_LINE_SYLLABLES)
+
+SPACY_MODEL = "en_core_web_sm"
+
+# Sentence segmentation modes for HaikuFinder:
+#   full        - the whole spaCy pipeline (tagger, parser, NER, lemmatizer)
+#   parser      - only the dependency parser, which is what sets doc.sents in
+#                 the small English model; boundaries are identical to full
+#   sentencizer - rule-based punctuation splitting, fastest but not identical
+SEGMENTERS = ['full', 'parser', 'sentencizer']
+PARSER_ONLY_EXCLUDES = ['tagger', 'attribute_ruler', 'lemmatizer', 'ner']
+
+# News prose repeats the same few thousand words constantly, so syllable
+# counts are memoized per term. Errors are not cached and raise every time.
+SYLLABLE_CACHE_SIZE = 65536
+
+PLUS_SUFFIX_PATTERN = re.compile(r'(.+)\+$')
+POSSESSIVE_PATTERN = re.compile(r"(.+)'s$")
+YEAR_PATTERN = re.compile(r'([0-9]{4})s?$')
+NUMBER_PATTERN = re.compile(r'[0-9,]+$')
+NUMBER_RANGE_PATTERN = re.compile(r'([0-9]+)-([0-9]+)$')
+COMPOUND_PATTERN = re.compile(r'([^-]+)[-/](.+)$')
+
 
 def clean_term(term):
     return unidecode(term).strip().lower().strip(punctuation)
@@ -24,23 +43,56 @@ def is_special_punctuation(term):
     return term in SPECIAL_PUNCTUATION_BREAKS
 
 
-def has_syllable_exception(term):
-    return term in syllapy.WORD_DICT
+# spaCy and num2words are imported on first use, they are slow to import and
+# scripts that only touch the database never need them
+
+@lru_cache(maxsize=4096)
+def year_words(year):
+    from num2words import num2words
+    return tuple(num2words(year, to='year').split())
+
+
+@lru_cache(maxsize=4096)
+def number_words(number):
+    from num2words import num2words
+    return tuple(num2words(number).split())
+
+
+def could_be_haiku(words):
+    '''Cheap bound before any syllables are counted.
+
+    Every word other than a special punctuation break needs at least one
+    syllable, so a haiku has between one word per line and one per syllable.'''
+    word_count = sum(1 for word in words if not is_special_punctuation(word))
+    return len(HAIKU_LINE_SYLLABLES) <= word_count <= HAIKU_SYLLABLES
+
+
+def load_segmenter(segmenter):
+    '''Returns a spaCy pipeline that runs only what the segmentation mode needs'''
+    if segmenter not in SEGMENTERS:
+        raise ValueError(f"Unknown segmenter {segmenter}, expected one of {SEGMENTERS}")
+
+    import spacy
+
+    if segmenter == 'full':
+        return spacy.load(SPACY_MODEL)
+
+    if segmenter == 'parser':
+        return spacy.load(SPACY_MODEL, exclude=PARSER_ONLY_EXCLUDES)
+
+    nlp = spacy.blank("en")
+    nlp.add_pipe("sentencizer")
+    return nlp
 
 
 class HaikuFinder():
-    def __init__(self):
-        self.nlp = spacy.load("en_core_web_sm")
-
-        # Load additional syllable definitions beyond syllapy
-        syllable_file_path = os.path.join(os.path.dirname(__file__), 'data', 'syllable_counts.csv')
-        with open(syllable_file_path, newline='') as file:
-            reader = csv.reader(file)
-            for row in reader:
-                if len(row) == 2:
-                    word = row[0].lower()
-                    count = int(row[1])
-                    syllapy.WORD_DICT[word] = count
+    def __init__(self, segmenter='full', syllable_cache_size=SYLLABLE_CACHE_SIZE, syllables=None):
+        self.segmenter = segmenter
+        self.nlp = load_segmenter(segmenter)
+        self._cached_syllables_for_term = lru_cache(maxsize=syllable_cache_size)(self._count_syllables_for_term)
+
+        # syllapy's words plus our own from data/syllable_counts.csv, compiled once and shared
+        self.syllables = syllables or syllable_dict.load()
 
     def sentences_from_article(self, text):
         if not text:
@@ -50,35 +102,43 @@ class HaikuFinder():
         return [s.text.rstrip() for s in doc.sents]
 
     def syllables_for_term(self, term):
+        return self._cached_syllables_for_term(term)
+
+    def syllable_cache_info(self):
+        '''Hit/miss statistics for the term -> syllable count cache'''
+        return self._cached_syllables_for_term.cache_info()
+
+    def clear_syllable_cache(self):
+        self._cached_syllables_for_term.cache_clear()
+
+    def _count_syllables_for_term(self, term):
         if is_special_punctuation(term):
             return 0
 
         # Some things to do before stripping the term
         # Disney+, Apple+, etc.
-        r = re.match('(.+)\+$', term)
+        r = PLUS_SUFFIX_PATTERN.match(term)
         if r:
             return self.syllables_for_term(r.group(1)) + 1
 
         stripped_term = clean_term(term)
         try:
-            if has_syllable_exception(stripped_term):
-                return syllapy.count(stripped_term)
+            if stripped_term in self.syllables:
+                return self.syllables.count(stripped_term)
 
-            r = re.match("(.+)'s$", stripped_term)
+            r = POSSESSIVE_PATTERN.match(stripped_term)
             if r:
                 # Most possessive's don't add syllables
-                return syllapy.count(r.group(1))
+                return self.syllables.count(r.group(1))
 
-            r = re.match('([0-9]{4})s?$', stripped_term)
+            r = YEAR_PATTERN.match(stripped_term)
             if r:
-                terms = num2words(r.group(1), to='year').split()
-                return reduce(operator.add, [self.syllables_for_term(term) for term in terms])
+                return sum(self.syllables_for_term(term) for term in year_words(r.group(1)))
 
-            if re.match('[0-9,]+$', stripped_term):
-                terms = num2words(int(stripped_term.replace(',', ''))).split()
-                return reduce(operator.add, [self.syllables_for_term(term) for term in terms])
+            if NUMBER_PATTERN.match(stripped_term):
+                return sum(self.syllables_for_term(term) for term in number_words(int(stripped_term.replace(',', ''))))
 
-            r = re.match('([0-9]+)-([0-9]+)$', stripped_term)
+            r = NUMBER_RANGE_PATTERN.match(stripped_term)
             if r:
                 s1 = self.syllables_for_term(r.group(1))
                 s2 = self.syllables_for_term(r.group(2))
@@ -87,7 +147,7 @@ class HaikuFinder():
                 else:
                     return 0
 
-            r = re.match('([^-]+)[-/](.+)$', stripped_term)
+            r = COMPOUND_PATTERN.match(stripped_term)
             if r:
                 s1 = self.syllables_for_term(r.group(1))
                 s2 = self.syllables_for_term(r.group(2))
@@ -97,59 +157,66 @@ class HaikuFinder():
                 else:
                     return 0
 
-            c = syllapy.count(stripped_term)
+            c = self.syllables.count(stripped_term)
             return c
 
         except RuntimeError as err:
             raise SyllableCountError("Unable to count syllables for term")
 
-    def terms_from_sentence(self, text):
+    def words_from_sentence(self, text):
         cleaned_text = text.strip("[ \r\n\t\"“”'’\\(\\)\\[\\];]")
-        return [(t, self.syllables_for_term(t)) for t in cleaned_text.split()]
+        return cleaned_text.split()
+
+    def terms_from_sentence(self, text):
+        return [(t, self.syllables_for_term(t)) for t in self.words_from_sentence(text)]
+
+    def seek_line(self, lines, max_syllables, words, start):
+        '''Appends the line starting at words[start] to lines and returns the index after it.
 
-    def seek_line(self, lines, max_syllables, terms):
-        '''These arguments are passed by reference and altered'''
+        Syllables are only counted as far as the line needs, so a sentence that
+        overruns a line boundary is rejected without counting the rest of it.'''
         syllable_count = 0
-        line = []
+        index = start
 
         while syllable_count < max_syllables:
-            if not terms:
+            if index >= len(words):
                 raise LineMismatchError("Line is too short")
 
-            term, syllables = terms.pop(0)
+            term = words[index]
+            syllables = self.syllables_for_term(term)
+            index += 1
 
             if syllables == 0 and not is_special_punctuation(term):
                 raise LineMismatchError("Syllable count missing for term")
-        
+
             syllable_count += syllables
-            line.append(term)
 
             if syllable_count > max_syllables:
                 raise LineMismatchError("Line is too long")
 
-        lines.append(' '.join(line))
+        lines.append(' '.join(words[start:index]))
+        return index
 
-    def seek_eol(self, terms):
-        if terms:
+    def seek_eol(self, words, index):
+        if index < len(words):
             raise LineMismatchError("Line is too long")
 
     def find_haiku(self, sentence_text):
-        try:
-            terms = self.terms_from_sentence(sentence_text)
-        except SyllableCountError:
+        words = self.words_from_sentence(sentence_text)
+        if not could_be_haiku(words):
             return None
-    
+
         lines = []
 
         try:
-            self.seek_line(lines, 5, terms)
-            self.seek_line(lines, 7, terms)
-            self.seek_line(lines, 5, terms)
-            self.seek_eol(terms)
+            index = 0
+            for max_syllables in HAIKU_LINE_SYLLABLES:
+                index = self.seek_line(lines, max_syllables, words, index)
+            self.seek_eol(words, index)
 
             return {"lines": lines, "sentence": sentence_text, "hash": hashlib.md5(sentence_text.encode('utf-8')).hexdigest()}
 
-        except LineMismatchError:
+        except (LineMismatchError, SyllableCountError):
             return None
 
     def find_haikus_in_article(self, body_text):
@@ -0,0 +1,29 @@
+from nyt_haiku.models import Haiku
+
+
+def hash_key(haiku_hash: str):
+    '''Haiku hashes are md5 hex digests, which fit in 16 bytes instead of a 32 character str'''
+    try:
+        return bytes.fromhex(haiku_hash)
+    except ValueError:
+        return haiku_hash
+
+
+class HaikuHashIndex:
+    '''In-memory set of the hashes of every saved haiku, so duplicate checks never hit SQLite'''
+
+    def __init__(self, hashes=()):
+        self.keys = set(hash_key(h) for h in hashes)
+
+    @classmethod
+    async def load(cls):
+        return cls(await Haiku.all().values_list('hash', flat=True))
+
+    def __contains__(self, haiku_hash: str) -> bool:
+        return hash_key(haiku_hash) in self.keys
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def add(self, haiku_hash: str):
+        self.keys.add(hash_key(haiku_hash))
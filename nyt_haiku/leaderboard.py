@@ -0,0 +1,46 @@
+import os
+import json
+
+from nyt_haiku.section_cache import content_digest
+
+# The haiku_score table holds the summed counts of every tweeted haiku with
+# any, kept up to date by triggers on the haiku table (see migrations), so
+# whichever code changes the counts, the ranking is an index walk.
+
+LEADERBOARD_SIZE = 50
+
+LEADERBOARD_QUERY = 'SELECT h.tweet_id, h.line0, h.line1, h.line2, h.favorite_count, h.retweet_count, h.quote_count, a.url, a.title FROM haiku_score s JOIN haiku h ON h.id = s.haiku_id JOIN article a ON a.id = h.article_id ORDER BY s.score DESC, s.haiku_id LIMIT ?'
+
+
+async def top_haikus(conn, size: int = LEADERBOARD_SIZE) -> list:
+    '''The size most popular tweeted haiku, ties going to the oldest'''
+    return await conn.execute_query_dict(LEADERBOARD_QUERY, [size])
+
+
+def leaderboard_digest(haikus, template_source: str) -> str:
+    return content_digest(json.dumps([haikus, template_source], sort_keys=True, default=str))
+
+
+async def publish_html(conn, path: str, env, template_name: str = 'index.html', size: int = LEADERBOARD_SIZE) -> bool:
+    '''Renders the leaderboard to path with the jinja template, returning whether the file was written.
+
+    A digest of the haiku and the template source is kept in path.sha1, and
+    rendering is skipped when neither has changed since the last write.'''
+    haikus = await top_haikus(conn, size)
+    template_source = env.loader.get_source(env, template_name)[0]
+    digest = leaderboard_digest(haikus, template_source)
+
+    digest_path = f"{path}.sha1"
+    if os.path.exists(path) and os.path.exists(digest_path):
+        with open(digest_path) as file:
+            if file.read() == digest:
+                return False
+
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as file:
+        file.write(env.get_template(template_name).render(haikus=haikus))
+    os.replace(tmp_path, path)
+
+    with open(digest_path, 'w') as file:
+        file.write(digest)
+    return True
@@ -0,0 +1,86 @@
+import json
+from datetime import timedelta
+
+from tortoise import timezone
+
+from nyt_haiku.models import LiveBlog
+
+# A live blog is polled again after POLL_INTERVAL seconds, twice as long after
+# each poll with no new posts up to MAX_POLL_INTERVAL, and not at all once it
+# has had no new posts for QUIET_AFTER seconds. A poll that fails backs off the
+# same way, and polling stops after MAX_POLL_FAILURES failures in a row.
+POLL_INTERVAL = 15 * 60
+MAX_POLL_INTERVAL = 2 * 60 * 60
+QUIET_AFTER = 12 * 60 * 60
+MAX_POLL_FAILURES = 5
+
+
+def known_posts(live_blog) -> dict:
+    '''Post id -> digest from the last poll, or None for a blog not seen before'''
+    if live_blog is None:
+        return None
+    return json.loads(live_blog.posts)
+
+
+def schedule(live_blog: LiveBlog, posts: dict, now, poll_interval:int=POLL_INTERVAL,
+             max_poll_interval:int=MAX_POLL_INTERVAL, quiet_after:int=QUIET_AFTER) -> int:
+    '''Records a poll that found posts and sets when to poll next, returning how many posts were new or changed'''
+    known = json.loads(live_blog.posts)
+    changed = sum(1 for post_id, digest in posts.items() if known.get(post_id) != digest)
+
+    live_blog.posts = json.dumps(posts)
+    live_blog.checked_at = now
+    if changed or live_blog.changed_at is None:
+        live_blog.changed_at = now
+        live_blog.poll_interval = poll_interval
+    else:
+        live_blog.poll_interval = min(live_blog.poll_interval * 2, max_poll_interval)
+
+    live_blog.finished = now - live_blog.changed_at >= timedelta(seconds=quiet_after)
+    live_blog.next_poll_at = now + timedelta(seconds=live_blog.poll_interval)
+    return changed
+
+
+async def due_live_blogs(now=None):
+    '''Returns the unfinished live blogs whose next poll is due, with their articles'''
+    return await LiveBlog.filter(finished=False, next_poll_at__lte=now or timezone.now()).order_by('next_poll_at').prefetch_related('article')
+
+
+async def update_live_blog(logger, live_blog, article, posts, now=None):
+    '''Saves the posts found on a poll of a live blog, starting to track it if it is new.
+
+    posts is None when the page is no longer a live blog or has turned out
+    sensitive, which ends polling.'''
+    if posts is None:
+        if live_blog:
+            live_blog.finished = True
+            await live_blog.save()
+        return live_blog
+
+    if live_blog is None:
+        live_blog = LiveBlog(article=article, poll_interval=POLL_INTERVAL)
+
+    changed = schedule(live_blog, posts, now or timezone.now())
+    await live_blog.save()
+
+    if live_blog.finished:
+        logger.info(f"LIVE    {article.url} quiet since {live_blog.changed_at}, done polling")
+    else:
+        logger.info(f"LIVE    {article.url} {changed} new posts, next poll {live_blog.next_poll_at}")
+    return live_blog
+
+
+async def poll_failed(logger, live_blog: LiveBlog, article, failures: int, now=None,
+                      max_poll_interval:int=MAX_POLL_INTERVAL, max_failures:int=MAX_POLL_FAILURES):
+    '''Puts off the next poll of a live blog whose page couldn't be fetched or parsed,
+    giving up on it after max_failures failures in a row'''
+    live_blog.poll_interval = min(live_blog.poll_interval * 2, max_poll_interval)
+    live_blog.next_poll_at = (now or timezone.now()) + timedelta(seconds=live_blog.poll_interval)
+    live_blog.finished = failures >= max_failures
+    await live_blog.save()
+
+    if live_blog.finished:
+        logger.info(f"LIVE    {article.url} failed {failures} polls in a row, done polling")
+    else:
+        logger.info(f"LIVE    {article.url} poll failed, next poll {live_blog.next_poll_at}")
+    return live_blog
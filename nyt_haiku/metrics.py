@@ -0,0 +1,180 @@
+import os
+import re
+import json
+import time
+import asyncio
+from collections import Counter
+from contextlib import contextmanager
+
+PROMETHEUS_PREFIX = 'nyt_haiku'
+
+# Defaults for LoopLagMonitor
+LAG_INTERVAL = 0.1
+LAG_THRESHOLD = 0.25
+
+
+class TimerStats:
+    '''Count, total and longest of a set of timings'''
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, seconds: float):
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def merge(self, other):
+        self.count += other.count
+        self.total += other.total
+        self.max = max(self.max, other.max)
+
+    def as_dict(self) -> dict:
+        return {'count': self.count, 'seconds': self.total, 'max_seconds': self.max}
+
+
+class Metrics:
+    '''Counters and timers for one run of the bot.
+
+    Plain data, so a worker process can fill in its own and send it back to be
+    merged into the run's metrics.'''
+
+    def __init__(self):
+        self.counters = Counter()
+        self.timers = {}
+        self.started_at = time.time()
+
+    def count(self, name: str, amount=1):
+        self.counters[name] += amount
+
+    def observe(self, name: str, seconds: float):
+        if name not in self.timers:
+            self.timers[name] = TimerStats()
+        self.timers[name].add(seconds)
+
+    @contextmanager
+    def timer(self, name: str):
+        '''Times the block, including any awaits inside it'''
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start)
+
+    def merge(self, other):
+        self.counters.update(other.counters)
+        for name, stats in other.timers.items():
+            if name not in self.timers:
+                self.timers[name] = TimerStats()
+            self.timers[name].merge(stats)
+
+    def as_dict(self) -> dict:
+        return {
+            'started_at': self.started_at,
+            'elapsed_seconds': time.time() - self.started_at,
+            'counters': dict(self.counters),
+            'timers': {name: stats.as_dict() for name, stats in self.timers.items()},
+        }
+
+    def summary(self) -> list:
+        '''One line per timer, slowest total first, then the counters'''
+        lines = []
+        for name, stats in sorted(self.timers.items(), key=lambda item: item[1].total, reverse=True):
+            mean = stats.total / stats.count if stats.count else 0
+            lines.append(f"{name}: {stats.total:.3f}s total, {stats.count} times, {mean * 1000:.1f}ms mean, {stats.max * 1000:.1f}ms max")
+        if self.counters:
+            lines.append(', '.join(f"{count} {name}" for name, count in sorted(self.counters.items())))
+        return lines
+
+    def prometheus(self) -> str:
+        '''Formats the metrics for the node_exporter textfile collector'''
+        lines = []
+
+        def line(kind, name, value, help_text):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            lines.append(f"{name} {value}")
+
+        def gauge(name, value, help_text):
+            line('gauge', name, value, help_text)
+
+        gauge(f"{PROMETHEUS_PREFIX}_run_started_timestamp_seconds", self.started_at, "When the last run started")
+        gauge(f"{PROMETHEUS_PREFIX}_run_seconds", time.time() - self.started_at, "How long the last run took")
+        for name, count in sorted(self.counters.items()):
+            line('counter', f"{PROMETHEUS_PREFIX}_{metric_name(name)}_total", count, f"{name} in the last run")
+        for name, stats in sorted(self.timers.items()):
+            metric = f"{PROMETHEUS_PREFIX}_{metric_name(name)}"
+            gauge(f"{metric}_seconds_sum", stats.total, f"Time spent on {name} in the last run")
+            gauge(f"{metric}_seconds_count", stats.count, f"Number of times {name} ran in the last run")
+            gauge(f"{metric}_seconds_max", stats.max, f"Longest {name} in the last run")
+        return '\n'.join(lines) + '\n'
+
+    def export(self, path: str, format: str = 'json'):
+        '''Writes the metrics to path as JSON or Prometheus text, replacing the file atomically'''
+        if format == 'json':
+            text = json.dumps(self.as_dict(), indent=2)
+        elif format == 'prometheus':
+            text = self.prometheus()
+        else:
+            raise ValueError(f"Unknown metrics format {format}, expected json or prometheus")
+
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w') as file:
+            file.write(text)
+        os.replace(tmp_path, path)
+
+
+class NullMetrics(Metrics):
+    '''Metrics that records nothing, the default for callers that don't collect any'''
+
+    def count(self, name: str, amount=1):
+        pass
+
+    def observe(self, name: str, seconds: float):
+        pass
+
+    def merge(self, other):
+        pass
+
+
+NULL_METRICS = NullMetrics()
+
+
+def metric_name(name: str) -> str:
+    return re.sub('[^a-z0-9]+', '_', name.lower()).strip('_')
+
+
+class LoopLagMonitor:
+    '''Measures how late the event loop wakes up from a short sleep.
+
+    Anything that blocks the loop (parsing on it, a synchronous DB call) shows
+    up as lag; lag over threshold is counted and logged as a warning.'''
+
+    def __init__(self, logger, metrics: Metrics, interval: float = LAG_INTERVAL, threshold: float = LAG_THRESHOLD):
+        self.logger = logger
+        self.metrics = metrics
+        self.interval = interval
+        self.threshold = threshold
+        self.task = None
+
+    def start(self):
+        self.task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self.task:
+            self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions=True)
+            self.task = None
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            start = loop.time()
+            await asyncio.sleep(self.interval)
+            lag = max(loop.time() - start - self.interval, 0)
+            self.metrics.observe('event loop lag', lag)
+            if lag > self.threshold:
+                self.metrics.count('event loop blocked')
+                self.logger.warning(f"BLOCKED event loop for {lag * 1000:.0f}ms")
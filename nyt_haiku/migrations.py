@@ -0,0 +1,99 @@
+from tortoise import Tortoise
+from tortoise.transactions import in_transaction
+
+# Schema changes on top of the tables tortoise generates from nyt_haiku.models.
+# Each entry is one version, a list of SQL statements. SQLite's user_version
+# pragma records how many have been applied, so existing databases pick up new
+# entries on startup. Only ever append to this list.
+MIGRATIONS = [
+    # 1: indexes for the bot's own queries
+    [
+        # nyt.unparsed_articles
+        'CREATE INDEX IF NOT EXISTS "idx_article_parsed_id" ON "article" ("parsed", "id")',
+        # haiku lookups per article
+        'CREATE INDEX IF NOT EXISTS "idx_haiku_article_id" ON "haiku" ("article_id")',
+        # untweeted haiku and timeline reconciliation in twitter.tweet
+        'CREATE INDEX IF NOT EXISTS "idx_haiku_tweet_id" ON "haiku" ("tweet_id")',
+        # the two hour cooldown in twitter.tweet
+        'CREATE INDEX IF NOT EXISTS "idx_haiku_tweeted_at" ON "haiku" ("tweeted_at")',
+        # most popular haiku in publish.publish_html
+        'CREATE INDEX IF NOT EXISTS "idx_haiku_score" ON "haiku" (favorite_count + retweet_count + quote_count) WHERE tweet_id IS NOT NULL',
+    ],
+    # 2: live blogs due for another poll, the live_blog table is created by tortoise
+    [
+        'CREATE INDEX IF NOT EXISTS "idx_live_blog_next_poll_at" ON "live_blog" ("finished", "next_poll_at")',
+    ],
+    # 3: untweeted haiku numbered 1..N for random picks, see nyt_haiku.candidates
+    [
+        'CREATE TABLE IF NOT EXISTS "tweet_candidate" ("slot" INTEGER PRIMARY KEY, "haiku_id" INT NOT NULL UNIQUE, "article_id" INT NOT NULL)',
+        'INSERT INTO "tweet_candidate" ("slot", "haiku_id", "article_id") SELECT ROW_NUMBER() OVER (ORDER BY "id"), "id", "article_id" FROM "haiku" WHERE "tweet_id" IS NULL',
+        """CREATE TRIGGER IF NOT EXISTS "haiku_candidate_insert" AFTER INSERT ON "haiku" WHEN NEW."tweet_id" IS NULL BEGIN
+            INSERT INTO "tweet_candidate" ("slot", "haiku_id", "article_id")
+                VALUES ((SELECT IFNULL(MAX("slot"), 0) + 1 FROM "tweet_candidate"), NEW."id", NEW."article_id");
+        END""",
+        # Removing a candidate moves the last one into its slot so the slots stay dense.
+        # It is parked at its negated slot first, which frees that slot and remembers it.
+        """CREATE TRIGGER IF NOT EXISTS "haiku_candidate_tweeted" AFTER UPDATE OF "tweet_id" ON "haiku" WHEN OLD."tweet_id" IS NULL AND NEW."tweet_id" IS NOT NULL BEGIN
+            UPDATE "tweet_candidate" SET "slot" = -"slot" WHERE "haiku_id" = OLD."id";
+            UPDATE "tweet_candidate" SET "slot" = (SELECT -"slot" FROM "tweet_candidate" WHERE "haiku_id" = OLD."id")
+                WHERE "slot" = (SELECT MAX("slot") FROM "tweet_candidate")
+                AND "slot" > (SELECT -"slot" FROM "tweet_candidate" WHERE "haiku_id" = OLD."id");
+            DELETE FROM "tweet_candidate" WHERE "haiku_id" = OLD."id";
+        END""",
+        """CREATE TRIGGER IF NOT EXISTS "haiku_candidate_delete" AFTER DELETE ON "haiku" WHEN OLD."tweet_id" IS NULL BEGIN
+            UPDATE "tweet_candidate" SET "slot" = -"slot" WHERE "haiku_id" = OLD."id";
+            UPDATE "tweet_candidate" SET "slot" = (SELECT -"slot" FROM "tweet_candidate" WHERE "haiku_id" = OLD."id")
+                WHERE "slot" = (SELECT MAX("slot") FROM "tweet_candidate")
+                AND "slot" > (SELECT -"slot" FROM "tweet_candidate" WHERE "haiku_id" = OLD."id");
+            DELETE FROM "tweet_candidate" WHERE "haiku_id" = OLD."id";
+        END""",
+        """CREATE TRIGGER IF NOT EXISTS "haiku_candidate_untweeted" AFTER UPDATE OF "tweet_id" ON "haiku" WHEN OLD."tweet_id" IS NOT NULL AND NEW."tweet_id" IS NULL BEGIN
+            INSERT INTO "tweet_candidate" ("slot", "haiku_id", "article_id")
+                VALUES ((SELECT IFNULL(MAX("slot"), 0) + 1 FROM "tweet_candidate"), NEW."id", NEW."article_id");
+        END""",
+    ],
+    # 4: scores of tweeted haiku that have any, ranked for publish.publish_html, see nyt_haiku.leaderboard
+    [
+        'CREATE TABLE IF NOT EXISTS "haiku_score" ("haiku_id" INTEGER PRIMARY KEY, "score" INT NOT NULL)',
+        'CREATE INDEX IF NOT EXISTS "idx_haiku_score_rank" ON "haiku_score" ("score" DESC, "haiku_id")',
+        'INSERT INTO "haiku_score" ("haiku_id", "score") SELECT "id", "favorite_count" + "retweet_count" + "quote_count" FROM "haiku" WHERE "tweet_id" IS NOT NULL AND "favorite_count" + "retweet_count" + "quote_count" > 0',
+        """CREATE TRIGGER IF NOT EXISTS "haiku_score_insert" AFTER INSERT ON "haiku" WHEN NEW."tweet_id" IS NOT NULL AND NEW."favorite_count" + NEW."retweet_count" + NEW."quote_count" > 0 BEGIN
+            INSERT INTO "haiku_score" ("haiku_id", "score") VALUES (NEW."id", NEW."favorite_count" + NEW."retweet_count" + NEW."quote_count");
+        END""",
+        # ORM saves write every column, so only rows whose counts or tweet really changed are touched
+        """CREATE TRIGGER IF NOT EXISTS "haiku_score_update" AFTER UPDATE OF "tweet_id", "favorite_count", "retweet_count", "quote_count" ON "haiku"
+            WHEN OLD."tweet_id" IS NOT NEW."tweet_id" OR OLD."favorite_count" IS NOT NEW."favorite_count"
+                OR OLD."retweet_count" IS NOT NEW."retweet_count" OR OLD."quote_count" IS NOT NEW."quote_count" BEGIN
+            DELETE FROM "haiku_score" WHERE "haiku_id" = OLD."id";
+            INSERT INTO "haiku_score" ("haiku_id", "score") SELECT NEW."id", NEW."favorite_count" + NEW."retweet_count" + NEW."quote_count"
+                WHERE NEW."tweet_id" IS NOT NULL AND NEW."favorite_count" + NEW."retweet_count" + NEW."quote_count" > 0;
+        END""",
+        """CREATE TRIGGER IF NOT EXISTS "haiku_score_delete" AFTER DELETE ON "haiku" BEGIN
+            DELETE FROM "haiku_score" WHERE "haiku_id" = OLD."id";
+        END""",
+        # Replaced by haiku_score, and no longer worth updating with every count change
+        'DROP INDEX IF EXISTS "idx_haiku_score"',
+    ],
+]
+
+
+async def schema_version(conn) -> int:
+    rows = await conn.execute_query_dict("PRAGMA user_version")
+    return rows[0]["user_version"]
+
+
+async def migrate(logger=None):
+    '''Creates any missing tables and applies the migrations this database has not seen yet'''
+    await Tortoise.generate_schemas(safe=True)
+
+    conn = Tortoise.get_connection("default")
+    version = await schema_version(conn)
+
+    for number, statements in enumerate(MIGRATIONS[version:], start=version + 1):
+        if logger:
+            logger.info(f"MIGRATE schema to version {number}")
+
+        async with in_transaction() as transaction:
+            for statement in statements:
+                await transaction.execute_query(statement)
+            await transaction.execute_query(f"PRAGMA user_version = {number}")
@@ -1,6 +1,8 @@
 from tortoise import Tortoise, run_async, fields
 from tortoise.models import Model
 
+from nyt_haiku import migrations
+
 
 class Article(Model):
     id = fields.IntField(pk=True)
@@ -18,6 +20,18 @@ class Article(Model):
     created_at = fields.DatetimeField(null=True, auto_now_add=True)
 
 
+class ArticleError(Model):
+    '''Failed fetches of an unparsed article, see nyt.record_article_error'''
+    id = fields.IntField(pk=True)
+    article = fields.OneToOneField('models.Article', related_name='error')
+    attempts = fields.IntField(null=False, default=0)
+    last_error = fields.TextField(null=True)
+    failed_at = fields.DatetimeField(null=True)
+
+    class Meta:
+        table = 'article_error'
+
+
 class Haiku(Model):
     id = fields.IntField(pk=True)
     hash = fields.CharField(max_length=255, unique=True, null=False)
@@ -35,6 +49,21 @@ class Haiku(Model):
     quote_count = fields.IntField(null=False, default=0)
 
 
+class LiveBlog(Model):
+    '''Polling state for a live blog article, see nyt_haiku.live_blogs'''
+    id = fields.IntField(pk=True)
+    article = fields.OneToOneField('models.Article', related_name='live_blog')
+    posts = fields.TextField(default='{}')
+    poll_interval = fields.IntField(null=False)
+    checked_at = fields.DatetimeField(null=True)
+    changed_at = fields.DatetimeField(null=True)
+    next_poll_at = fields.DatetimeField(null=True)
+    finished = fields.BooleanField(null=False, default=False)
+
+    class Meta:
+        table = 'live_blog'
+
+
 async def init(path):
     # Here we connect to a SQLite DB file.
     # also specify the app name of "models"
@@ -43,10 +72,12 @@ async def init(path):
         db_url=f'sqlite://{path}',
         modules={'models': ['nyt_haiku.models']}
     )
+    await migrations.migrate()
 
 
 async def setup_db():
-    await Tortoise.generate_schemas()
+    # Tables and indexes are created by init, so this is safe on an existing DB
+    await migrations.migrate()
 
 
 async def close_db():
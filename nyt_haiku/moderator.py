@@ -1,12 +1,73 @@
 import os
 import re
+import time
+
+from nyt_haiku.term_index import TermIndex
+
+
+# Awkwardness rules for ArticleModerator.is_awkward, evaluated in this order.
+# Each rule is a name and the (method, pattern[, flags]) checks that must all
+# match the text, where method is a compiled pattern's search, match or fullmatch.
+AWKWARD_RULES = [
+    ('multi-character abbreviation', [('search', r'[A-Z]\.[A-Z]\.')]),
+    ('single initial', [('search', r'\b[A-Z]\. ')]),
+    # Multiple capitalized letters in a row (suggests a dateline)
+    ('capitals in a row', [('search', r'[A-Z][A-Z]+')]),
+    ('ordinal', [('search', r'[0-9]+(nd|st|th)')]),
+    ('website', [('search', r'([A-Za-z0-9]+)\.(com|org|net|ly|io)')]),
+    ('bad starter', [('fullmatch', r"^[—\-\('’,;a-z].*")]),
+    ('internal quote', [('search', r' [‘“"][A-Za-z]|[”"’] ')]),
+    ('unclosed quote', [('match', r'[‘“"\']'), ('search', r'[^‘“"\']$')]),
+    ('unopened quote', [('match', r'[^‘“"\']'), ('search', r'[‘“"\']$')]),
+    ('unclosed parenthesis', [('search', r'\([^\)]+$|\[[^\]]+$')]),
+    ('unopened parenthesis', [('match', r'[^\(]+\)|[^\[]+\]')]),
+    ('he said', [('search', r'\b(he|she) said')]),
+    ('bad end', [('fullmatch', r".+(([\-\);—:,])|(['’]s)|(\b(and|or|but)))")]),
+    ('bad character', [('search', r'[$@%#&\n\t]')]),
+    ('NYT credit', [('search', r'(^By )|(photograph by)|(contributed reporting)|(the New York Times)|(The Times)|(illustration by)', re.IGNORECASE)]),
+]
+
+
+# Rules much cheaper than counting syllables, used to reject sentences early
+PREFILTER_RULES = ['capitals in a row', 'website', 'bad starter', 'he said', 'bad character']
+
+
+class AwkwardRule:
+    '''A precompiled awkwardness rule that counts its calls, hits and time spent'''
+
+    def __init__(self, name, checks):
+        self.name = name
+        self.checks = [getattr(re.compile(*check[1:]), check[0]) for check in checks]
+        self.calls = 0
+        self.hits = 0
+        self.seconds = 0.0
+        self.taken = (0, 0, 0.0)
+
+    def __call__(self, text):
+        start = time.perf_counter()
+        hit = all(check(text) for check in self.checks)
+        self.seconds += time.perf_counter() - start
+        self.calls += 1
+        if hit:
+            self.hits += 1
+        return hit
+
+    def take(self):
+        '''Calls, hits and seconds since the last take'''
+        calls, hits, seconds = self.taken
+        self.taken = (self.calls, self.hits, self.seconds)
+        return self.calls - calls, self.hits - hits, self.seconds - seconds
+
 
 class ArticleModerator:
     def __init__(self):
+        # Sensitive terms are matched on whole words
+        self.sensitive_index = TermIndex()
         self.init_sensitive_tags()
         self.init_sensitive_terms()
         self.init_sensitive_sections()
         self.init_awkward_abbreviations()
+        self.init_awkward_rules()
 
     def init_sensitive_tags(self):
         with open(os.path.join(os.path.dirname(__file__), 'data', 'sensitive_tags.txt')) as fp:
@@ -18,10 +79,10 @@ class ArticleModerator:
         with open(os.path.join(os.path.dirname(__file__), 'data', 'sensitive_terms.txt')) as fp:
             self.sensitive_terms = set(line for line in (l.strip() for l in fp) if line)
 
-        # print(f"SENSITIVE TERMS: {len(self.sensitive_terms)} loaded")
+        for term in sorted(self.sensitive_terms):
+            self.sensitive_index.add(term, 'term')
 
-        sensitive_regex_string = '|'.join([f"({t})" for t in self.sensitive_terms])
-        self.sensitive_term_regex = re.compile(f"\b{sensitive_regex_string}\b", re.IGNORECASE)
+        # print(f"SENSITIVE TERMS: {len(self.sensitive_terms)} loaded")
 
     def init_awkward_abbreviations(self):
         with open(os.path.join(os.path.dirname(__file__), 'data', 'bad_abbreviations.txt')) as fp:
@@ -30,6 +91,11 @@ class ArticleModerator:
         awkward_regex_string = '|'.join([f"({t})" for t in self.awkward_abbreviations]).replace(".", "\\.")
         self.awkward_abbreviation_regex = re.compile(awkward_regex_string)
 
+    def init_awkward_rules(self):
+        self.awkward_rules = [AwkwardRule('abbreviation', [('search', self.awkward_abbreviation_regex.pattern)])]
+        self.awkward_rules += [AwkwardRule(name, checks) for name, checks in AWKWARD_RULES]
+        self.prefilter_rules = [rule for rule in self.awkward_rules if rule.name in PREFILTER_RULES]
+
     def init_sensitive_sections(self):
         with open(os.path.join(os.path.dirname(__file__), 'data', 'sensitive_sections.txt')) as fp:
             self.sensitive_sections = set(line for line in (l.strip() for l in fp) if line)
@@ -41,70 +107,40 @@ class ArticleModerator:
         return tag in self.sensitive_sections
 
     def contains_sensitive_term(self, text):
-        return self.sensitive_term_regex.search(text)
-
-    def is_awkward(self, text):
-        if self.awkward_abbreviation_regex.search(text):
-            return True
-
-        # if not re.search(r'[.?!;]([‘“"\)])?$', text):
-        #     return True
-
-        # Multi-character abbreviations
-        if re.search('[A-Z]\\.[A-Z]\\.', text):
-            return True
-
-        # Single initials
-        if re.search(r'\b[A-Z]\. ', text):
-            return True
-
-        # Multiple capitalized letters in a row (suggests a dateline)
-        if re.search(r'[A-Z][A-Z]+', text):
-            return True
-
-        # Ordinals
-        if re.search(r'[0-9]+(nd|st|th)', text):
-            return True
+        '''Returns the sensitive term found in the text, or None'''
+        return self.sensitive_index.search(text, 'term')
 
-        # Websites
-        if re.search(r'([A-Za-z0-9]+)\.(com|org|net|ly|io)', text):
-            return True
+    def is_awkward(self, text, prefiltered=False):
+        '''With prefiltered, text already passed is_obviously_awkward, so PREFILTER_RULES are skipped'''
+        for rule in self.awkward_rules:
+            if prefiltered and rule.name in PREFILTER_RULES:
+                continue
+            if rule(text):
+                return True
 
-        # Bad starters
-        if re.fullmatch(r"^[—\-\('’,;a-z].*", text):
-            return True
-
-        # No internal quotes
-        if re.search(r' [‘“"][A-Za-z]', text) or re.search(r'[”"’] ', text):
-            return True
-
-        # Mismatched quotes
-        if re.match(r'[‘“"\']', text) and re.search(r'[^‘“"\']$', text):
-            return True
-
-        if re.match(r'[^‘“"\']', text) and re.search(r'[‘“"\']$', text):
-            return True
-
-        # Mismatched parens
-        if re.search(r'\([^\)]+$', text) or re.search(r'\[[^\]]+$', text):
-            return True
-
-        if re.match(r'[^\(]+\)', text) or re.match(r'[^\[]+\]', text):
-            return True
-
-        if re.search(r'\b(he|she) said', text):
-            return True
-
-        # Bad ends
-        if re.fullmatch(r".+(([\-\);—:,])|(['’]s)|(\b(and|or|but)))", text):
-            return True
-
-        # Bad anywhere
-        if re.search(r'[$@%#&\n\t]', text):
-            return True
+        return False
 
-        # NYT Credits
-        if re.search(r'(^By )|(photograph by)|(contributed reporting)|(the New York Times)|(The Times)|(illustration by)', text, flags=re.IGNORECASE):
-            return True
+    def is_obviously_awkward(self, text):
+        '''Runs only the cheap PREFILTER_RULES. A True here means is_awkward is True too.'''
+        for rule in self.prefilter_rules:
+            if rule(text):
+                return True
 
         return False
+
+    def awkward_rule_stats(self):
+        '''Calls, hits and seconds spent per awkwardness rule, in evaluation order'''
+        return [{"name": rule.name, "calls": rule.calls, "hits": rule.hits, "seconds": rule.seconds} for rule in self.awkward_rules]
+
+    def take_awkward_rule_stats(self):
+        '''Like awkward_rule_stats, counting only since the last take and leaving out rules not called'''
+        stats = []
+        for rule in self.awkward_rules:
+            calls, hits, seconds = rule.take()
+            if calls:
+                stats.append({"name": rule.name, "calls": calls, "hits": hits, "seconds": seconds})
+        return stats
+
+    def reorder_awkward_rules(self):
+        '''Evaluates the rules that reject most often first. The result of is_awkward is unchanged.'''
+        self.awkward_rules.sort(key=lambda rule: rule.hits, reverse=True)
@@ -1,19 +1,58 @@
 import re
+import codecs
 import sqlite3
 import tortoise
 import asyncio
+from collections import Counter
+from functools import lru_cache
+from tortoise import timezone
+from tortoise.transactions import in_transaction
 from urllib.parse import urljoin, urlparse
 
-from bs4 import BeautifulSoup, NavigableString, Comment
+from bs4 import BeautifulSoup, NavigableString, Comment, SoupStrainer
 from datetime import datetime
 from dateutil import parser
 import operator
-from functools import reduce
 
+from nyt_haiku.errors import ArticleTooLargeError
+from nyt_haiku import live_blogs
+from nyt_haiku.hash_index import HaikuHashIndex
+from nyt_haiku.metrics import NULL_METRICS
+from nyt_haiku.section_cache import content_digest
 from nyt_haiku.moderator import ArticleModerator
-from nyt_haiku.models import Article, Haiku
+from nyt_haiku.models import Article, ArticleError, Haiku
 
-ARTICLE_MODERATOR = ArticleModerator()
+
+@lru_cache(maxsize=None)
+def article_moderator() -> ArticleModerator:
+    '''The shared moderator, built on first use since it reads all the data files'''
+    return ArticleModerator()
+
+
+# BeautifulSoup settings for parse_article. Everything it reads is usually in a
+# meta, title or article tag, so the strained variants skip building the rest of
+# the page, and parse it all again when the body isn't in an article tag. lxml is
+# optional and much faster than Python's html.parser.
+ARTICLE_STRAINER = SoupStrainer(['meta', 'title', 'article'])
+HTML_PARSERS = {
+    'html.parser': {'features': 'html.parser'},
+    'html.parser-strained': {'features': 'html.parser', 'parse_only': ARTICLE_STRAINER},
+    'lxml': {'features': 'lxml'},
+    'lxml-strained': {'features': 'lxml', 'parse_only': ARTICLE_STRAINER},
+}
+DEFAULT_HTML_PARSER = 'html.parser'
+
+# Keeps url IN (...) lookups under SQLite's 999 bound variable limit
+URL_CHUNK_SIZE = 500
+
+# Defaults for the article fetch pipeline, see fetch_articles
+ARTICLE_CONCURRENCY = 15
+ARTICLE_BATCH_SIZE = 100
+MAX_ARTICLE_BYTES = 5 * 1024 * 1024
+
+# Fetches an article may fail before it is given up on, so pages that always
+# fail don't hold up the rest of the backlog on every run
+MAX_ARTICLE_ATTEMPTS = 3
 
 NYT_SECTION_PATTERN = '^https?://www.nytimes.com/(interactive/)?202'
 
@@ -57,82 +96,198 @@ def normalize_url(url:str) -> str:
     return urljoin(url, urlparse(url).path)
 
 
-async def section_callback(session, logger, section_url: str):
-    """Process a page and add links to the database"""
-    logger.debug(f"START SECTION {section_url}")
-    soup = None
-
-    async with session.get(section_url) as response:
-        soup = BeautifulSoup(await response.text(), 'html.parser')
-
+def section_links(section_url: str, html: str) -> set:
+    """Returns the normalized article links on a section page"""
+    soup = BeautifulSoup(html, 'html.parser')
     article_urls = [a.get('href') or '' for a in soup.find_all('a')]
 
     # if not http://, prepend domain name
     domain = '/'.join(section_url.split('/')[:3])
     article_urls = [url if '://' in url else operator.concat(domain, url) for url in article_urls]
-    article_urls = set([normalize_url(url) for url in article_urls if re.search(NYT_SECTION_PATTERN, url)])
+    return set([normalize_url(url) for url in article_urls if re.search(NYT_SECTION_PATTERN, url)])
+
+
+async def fetch_section_urls(session, logger, section_url: str, section_cache=None, metrics=NULL_METRICS) -> set:
+    """Fetches a section page and returns the article links on it.
+
+    With a SectionCache, returns an empty set when the page or its links are
+    unchanged since the last run, since those links are already saved."""
+    logger.debug(f"START SECTION {section_url}")
+    request_headers = section_cache.request_headers(section_url) if section_cache else {}
+
+    with metrics.timer('section fetch'):
+        async with session.get(section_url, headers=request_headers) as response:
+            if response.status == 304 and section_cache:
+                section_cache.record('not modified')
+                return set()
+
+            metrics.count('section bytes', len(await response.read()))
+            html = await response.text()
+            response_headers = response.headers
+            status = response.status
+
+    if not section_cache or status != 200:
+        return section_links(section_url, html)
+
+    body_digest = content_digest(html)
+    if section_cache.same_body(section_url, body_digest):
+        section_cache.record('same page')
+        return set()
+
+    article_urls = section_links(section_url, html)
+    links_digest = content_digest('\n'.join(sorted(article_urls)))
+    same_links = section_cache.same_links(section_url, links_digest)
+    section_cache.update(section_url, response_headers, body_digest, links_digest)
+
+    if same_links:
+        section_cache.record('same links')
+        return set()
+
+    section_cache.record('changed')
+    return article_urls
+
+
+async def known_urls(urls) -> set:
+    """Returns which of the given URLs are already in the article table"""
+    urls = list(urls)
+    known = set()
+
+    for i in range(0, len(urls), URL_CHUNK_SIZE):
+        known.update(await Article.filter(url__in=urls[i:i + URL_CHUNK_SIZE]).values_list('url', flat=True))
 
-    for url in article_urls:
-        try:
-            exists = await Article.get_or_create(url=url)
-            logger.debug(f"EXISTS {url}")
-            if not exists:
-                logger.debug(f"CREATE ARTICLE {url}")
-                await Article.create(url=url)
-        except (tortoise.exceptions.IntegrityError, sqlite3.IntegrityError):
-            pass
+    return known
 
 
-async def check_sections(session, logger):
+async def save_new_urls(logger, urls) -> int:
+    """Inserts the URLs not already known as new articles, returning how many were new"""
+    new_urls = sorted(set(urls) - await known_urls(urls))
+    if not new_urls:
+        return 0
+
+    # Stored the way tortoise stores auto_now_add datetimes in SQLite
+    created_at = timezone.now().isoformat(" ")
+
+    # INSERT OR IGNORE covers URLs added by another run since known_urls
+    async with in_transaction() as conn:
+        await conn.execute_many("INSERT OR IGNORE INTO article (url, parsed, sensitive, created_at) VALUES (?, 0, 0, ?)",
+                                [[url, created_at] for url in new_urls])
+
+    for url in new_urls:
+        logger.debug(f"CREATE ARTICLE {url}")
+
+    return len(new_urls)
+
+
+async def check_sections(session, logger, section_cache=None, metrics=NULL_METRICS):
     logger.info("SECTIONS start...")
-    await asyncio.gather(*[asyncio.create_task(section_callback(session, logger, url)) for url in NYT_SECTION_URLS], return_exceptions=True)
-    logger.info("SECTIONS done")
+    results = await asyncio.gather(*[asyncio.create_task(fetch_section_urls(session, logger, url, section_cache, metrics)) for url in NYT_SECTION_URLS], return_exceptions=True)
+
+    article_urls = set()
+    for section_url, result in zip(NYT_SECTION_URLS, results):
+        if isinstance(result, Exception):
+            metrics.count('section errors')
+            logger.info(f"ERROR   {section_url} {result!r}")
+        else:
+            article_urls |= result
+
+    with metrics.timer('db'):
+        created = await save_new_urls(logger, article_urls)
+    metrics.count('new articles', created)
+
+    if section_cache:
+        section_cache.save()
+        logger.info(f"SECTIONS cache {section_cache.summary()}")
+
+    logger.info(f"SECTIONS done, {created} new of {len(article_urls)} article links")
+
+
+def meta_index(soup) -> dict:
+    '''Indexes the meta tags by (attribute, value) for name and property in one pass'''
+    index = {}
+    for tag in soup.find_all('meta'):
+        for attr in ('name', 'property'):
+            value = tag.get(attr)
+            if value is not None:
+                index.setdefault((attr, value), []).append(tag)
+    return index
+
+
+def paragraph_strings(p_tags):
+    '''Yields the text of each paragraph followed by a newline, skipping comments'''
+    for p in p_tags:
+        for node in p.contents:
+            if type(node) is NavigableString:
+                yield node
+            elif isinstance(node, Comment):
+                continue
+            elif node.name == 'br':
+                yield ' \n '
+            else:
+                try:
+                    yield node.get_text()
+                except:
+                    yield node
+        yield '\n'
 
 
-def parse_article(logger, url: str, body_html:str, parse_sensitive:bool=False):
-    '''Returns metadata plus body text'''
+def story_body(soup):
+    '''The tag holding the paragraphs of an article, or None for a live blog'''
+    return soup.find("article", {"id": "story"}) or soup.find("article", {"id": "interactive"}) \
+        or soup.find("section", {"name": "articleBody"})
+
+
+def live_blog_posts(soup):
+    return soup.find_all("div", {"class": "live-blog-post"})
+
+
+def parse_article(logger, url: str, body_html:str, parse_sensitive:bool=False, html_parser:str=DEFAULT_HTML_PARSER, known_posts=None):
+    '''Returns metadata plus body text.
+
+    For a live blog, meta['live_blog_posts'] maps each post's id to a digest of
+    its text, and posts whose digest is in known_posts are left out of the body.'''
 
     meta = {}
-    soup = BeautifulSoup(body_html, 'html.parser')
+    soup = BeautifulSoup(body_html, **HTML_PARSERS[html_parser])
+    meta_tags = meta_index(soup)
 
-    # Get rid of comments
-    for comment in soup.find_all(text=lambda text: isinstance(text, Comment)):
-        comment.extract()
+    def first_meta(attr, value):
+        return meta_tags.get((attr, value), [None])[0]
 
     meta['sensitive'] = False
+    meta['live_blog_posts'] = None
     meta['parsed'] = True
-    meta['nyt_uri'] = soup.find('meta', attrs={'name':'nyt_uri'}).get("content", None)
-    meta['byline'] = soup.find('meta', attrs={'name':'byl'}).get("content", None)
-    meta['description'] = soup.find('meta', attrs={'name':'description'}).get("content", None)
-    meta['keywords'] = soup.find('meta', attrs={'name':'news_keywords'}).get("content", None)
-    meta['section'] = soup.find('meta', property='article:section').get("content", None)
+    meta['nyt_uri'] = first_meta('name', 'nyt_uri').get("content", None)
+    meta['byline'] = first_meta('name', 'byl').get("content", None)
+    meta['description'] = first_meta('name', 'description').get("content", None)
+    meta['keywords'] = first_meta('name', 'news_keywords').get("content", None)
+    meta['section'] = first_meta('property', 'article:section').get("content", None)
 
-    if ARTICLE_MODERATOR.is_sensitive_section(meta['section']):
+    if article_moderator().is_sensitive_section(meta['section']):
         logger.debug(f"SENSITIVE SECTION: {meta['section']} in {url}")
         meta['sensitive'] = True
 
-    title_tag = soup.find('meta', property='twitter:title')
+    title_tag = first_meta('property', 'twitter:title')
     if title_tag:
         meta['title'] = title_tag.get('content', None)
     else:
         meta['title'] = soup.title
 
-    if ARTICLE_MODERATOR.contains_sensitive_term(meta['title']):
-        logger.debug(f"SENSITIVE TITLE: {meta['title']} IN {url}")
+    sensitive_term = article_moderator().contains_sensitive_term(meta['title'])
+    if sensitive_term:
+        logger.debug(f"SENSITIVE TITLE: {meta['title']} ({sensitive_term}) IN {url}")
         meta['sensitive'] = True
 
-    published_tag = soup.find('meta', property='article:published')
+    published_tag = first_meta('property', 'article:published')
     if published_tag:
         meta['published_at'] = parser.parse(published_tag.get("content", None))
     else:
         meta['published_at'] = datetime.now()
 
-    a_tags_meta = soup.find_all("meta", attrs={'property':'article:tag'})
-    a_tags = [a.get('content') for a in a_tags_meta]
+    a_tags = [a.get('content') for a in meta_tags.get(('property', 'article:tag'), [])]
     meta['tags'] = ';'.join(a_tags)
 
     for tag in a_tags:
-        if ARTICLE_MODERATOR.is_sensitive_tag(tag):
+        if article_moderator().is_sensitive_tag(tag):
             logger.debug(f"SENSITIVE TAG: {tag} IN {url}")
             meta['sensitive'] = True
             break
@@ -140,95 +295,127 @@ def parse_article(logger, url: str, body_html:str, parse_sensitive:bool=False):
     if meta['sensitive'] and not parse_sensitive:
         return meta, None
 
-    body_found = False
-    try:
-        p_tags = list(soup.find("article", {"id": "story"}).find_all('p'))
-        body_found = True
-    except AttributeError:
-        pass
-
-    if not body_found:
-        try:
-            p_tags = list(soup.find("article", {"id": "interactive"}).find_all('p'))
-            body_found = True
-        except AttributeError:
-            pass
-
-    if not body_found:
-        try:
-            p_tags = []
-            for post in list(soup.find_all("div", {"class": "live-blog-post"})):
-                p_tags += post.find_all('p')
-            body_found = True
-        except AttributeError:
-            pass
-
-    if not body_found:
-        logger.info(f"ERROR   {url} NO PARAGRAPHS")
-        return meta, None
-
-    p_contents = reduce(operator.concat, [p.contents + [NavigableString('\n')] for p in p_tags], [])
-
-    body_strings  = []
-    for node in p_contents:
-        if type(node) is NavigableString:
-            body_strings.append(node)
+    article = story_body(soup)
+    posts = [] if article else live_blog_posts(soup)
+    settings = HTML_PARSERS[html_parser]
+    if not article and not posts and 'parse_only' in settings:
+        soup = BeautifulSoup(body_html, features=settings['features'])
+        article = story_body(soup)
+        posts = [] if article else live_blog_posts(soup)
+
+    if article:
+        return meta, ''.join(paragraph_strings(article.find_all('p')))
+
+    # Live blogs only return the text of posts that are new or changed since known_posts
+    known_digests = set(known_posts.values()) if known_posts else set()
+    post_digests = {}
+    post_texts = []
+    for post in posts:
+        text = ''.join(paragraph_strings(post.find_all('p')))
+        digest = content_digest(text)
+        post_digests[post.get('data-source-id') or digest] = digest
+        if digest not in known_digests:
+            post_texts.append(text)
+
+    meta['live_blog_posts'] = post_digests or None
+    return meta, ''.join(post_texts)
+
+
+# Metric names for the awkwardness rule counts, see record_awkward_rules
+AWKWARD_RULE_METRIC = 'awkward rule: {}'
+
+
+def record_awkward_rules(metrics):
+    '''Adds the awkwardness rule calls, hits and time since the last call to metrics,
+    then moves the rules that reject most often to the front'''
+    moderator = article_moderator()
+    for rule in moderator.take_awkward_rule_stats():
+        name = AWKWARD_RULE_METRIC.format(rule["name"])
+        metrics.count(f"{name} calls", rule["calls"])
+        metrics.count(f"{name} hits", rule["hits"])
+        metrics.observe(name, rule["seconds"])
+    moderator.reorder_awkward_rules()
+
+
+def awkward_rule_summary(metrics) -> str:
+    '''The rules recorded by record_awkward_rules, most hits first, as "name hits/calls time"'''
+    rules = []
+    for name, stats in metrics.timers.items():
+        if name.startswith(AWKWARD_RULE_METRIC.format('')):
+            rule = name[len(AWKWARD_RULE_METRIC.format('')):]
+            rules.append((metrics.counters[f"{name} hits"], metrics.counters[f"{name} calls"], stats.total, rule))
+    rules.sort(key=lambda rule: rule[0], reverse=True)
+    return ', '.join(f"{rule} {hits}/{calls} {seconds * 1000:.1f}ms" for hits, calls, seconds, rule in rules)
+
+
+def is_sensitive_haiku(logger, haiku, prefiltered:bool=False):
+    '''With prefiltered, the sentence already passed is_obviously_awkward and those rules are not run again'''
+    sensitive_term = article_moderator().contains_sensitive_term(haiku["sentence"])
+    if sensitive_term:
+        logger.debug(f"SENSITIVE HAIKU ({sensitive_term}): {haiku['sentence']}")
+        return True
+
+    return article_moderator().is_awkward(haiku["sentence"], prefiltered)
+
+
+def find_article_haikus(logger, haiku_finder, body: str, prefilter:bool=False, metrics=NULL_METRICS):
+    '''Returns the haiku in an article body that pass moderation, plus a Counter
+    of how many sentences each stage eliminated.
+
+    With prefilter, the cheap awkwardness rules run before syllable counting.
+    Moderation only looks at the sentence, so the haiku found are the same.'''
+    haikus = []
+    stats = Counter()
+
+    with metrics.timer('segmentation'):
+        sentences = haiku_finder.sentences_from_article(body)
+
+    for sentence in sentences:
+        stats['sentences'] += 1
+
+        if prefilter:
+            with metrics.timer('moderation'):
+                awkward = article_moderator().is_obviously_awkward(sentence)
+            if awkward:
+                stats['prefiltered'] += 1
+                continue
+
+        with metrics.timer('haiku search'):
+            haiku = haiku_finder.find_haiku(sentence)
+        if not haiku:
+            stats['not haiku'] += 1
+            continue
+
+        with metrics.timer('moderation'):
+            sensitive = is_sensitive_haiku(logger, haiku, prefilter)
+        if sensitive:
+            stats['moderated'] += 1
         else:
-            if node.name == 'br':
-                body_strings.append(' \n ')
-            else:
-                try:
-                    body_strings.append(node.get_text())
-                except:
-                    body_strings.append(node)
+            stats['haiku'] += 1
+            haikus.append(haiku)
 
-    body = ''.join(body_strings)
-    return meta, body
+    record_awkward_rules(metrics)
+    return haikus, stats
 
 
-async def save_haikus(logger, haiku_finder, article_id, url: str, body: str):
-    haikus = haiku_finder.find_haikus_in_article(body)
-    haiku_count = 0
+def process_article(logger, haiku_finder, url: str, body_html: str, html_parser:str=DEFAULT_HTML_PARSER, prefilter:bool=False, metrics=NULL_METRICS, known_posts=None):
+    '''Parses an article and returns its metadata, the haiku worth saving and
+    per-stage sentence counts, timing each step in metrics.
 
-    for haiku in haikus:
-        sensitive = ARTICLE_MODERATOR.contains_sensitive_term(haiku["sentence"]) or ARTICLE_MODERATOR.is_awkward(haiku["sentence"])
-        exists = await Haiku.exists(hash=haiku["hash"])
-        if not exists and not sensitive:
-            haiku_count += 1
-            logger.info(f'HAIKU {haiku["hash"]} {url}: {haiku["lines"][0]} / {haiku["lines"][1]} / {haiku["lines"][2]}')
+    This is the CPU-bound part of article_callback and only returns plain data,
+    so it can also run in a worker process (see nyt_haiku.workers).'''
 
-            try:
-                await Haiku.create(
-                    hash=haiku["hash"],
-                    sentence=haiku["sentence"],
-                    line0=haiku["lines"][0],
-                    line1=haiku["lines"][1],
-                    line2=haiku["lines"][2],
-                    article_id=article_id
-                )
-            except (tortoise.exceptions.IntegrityError, sqlite3.IntegrityError):
-                # print(f'HASH COLLISION FOR {haiku["hash"]}')
-                pass
-
-    return haiku_count
-
-
-async def article_callback(session, logger, haiku_finder, article: Article):
-    article.sensitive = False
-    text = None
-    headers = {'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_11_5) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/50.0.2661.102 Safari/537.36'}
+    with metrics.timer('parse'):
+        meta, body = parse_article(logger, url, body_html, html_parser=html_parser, known_posts=known_posts)
 
-    async with session.get(article.url, headers=headers) as response:
-        text = await response.text()
+    if meta['sensitive']:
+        return meta, [], Counter()
 
-    meta, body = parse_article(logger, article.url, text)
+    haikus, stats = find_article_haikus(logger, haiku_finder, body, prefilter, metrics)
+    return meta, haikus, stats
 
-    if meta['sensitive']:
-        logger.info(f"SKIP    {article.url} SENSITIVE")
-    else:
-        haiku_count = await save_haikus(logger, haiku_finder, article.id, article.url, body)
-        logger.info(f"FOUND {haiku_count} {article.url}")
 
+def apply_meta(article: Article, meta):
     article.parsed = True
     article.sensitive = meta['sensitive']
     article.title = meta['title']
@@ -240,11 +427,192 @@ async def article_callback(session, logger, haiku_finder, article: Article):
     article.tags = meta['tags']
     article.section = meta['section']
 
-    await article.save()
+
+async def write_article(article: Article, haikus):
+    async with in_transaction() as conn:
+        await Haiku.bulk_create([Haiku(hash=haiku["hash"],
+                                       sentence=haiku["sentence"],
+                                       line0=haiku["lines"][0],
+                                       line1=haiku["lines"][1],
+                                       line2=haiku["lines"][2],
+                                       article_id=article.id) for haiku in haikus], using_db=conn)
+        await article.save(using_db=conn)
+
+
+async def save_article(logger, hash_index, article: Article, haikus) -> int:
+    '''Saves the article and its haiku not seen before in one transaction, returning how many were new'''
+    new_haikus = {}
+    for haiku in haikus:
+        if haiku["hash"] not in hash_index:
+            new_haikus.setdefault(haiku["hash"], haiku)
+    new_haikus = list(new_haikus.values())
+
+    try:
+        await write_article(article, new_haikus)
+    except (tortoise.exceptions.IntegrityError, sqlite3.IntegrityError):
+        # Another process or article in flight saved some of these since they were checked
+        new_hashes = [haiku["hash"] for haiku in new_haikus]
+        saved = set(await Haiku.filter(hash__in=new_hashes).values_list('hash', flat=True))
+        new_haikus = [haiku for haiku in new_haikus if haiku["hash"] not in saved]
+        await write_article(article, new_haikus)
+
+    # Only once committed, so a failed write never leaves its haiku counted as duplicates
+    for haiku in new_haikus:
+        hash_index.add(haiku["hash"])
+
+    for haiku in new_haikus:
+        logger.info(f'HAIKU {haiku["hash"]} {article.url}: {haiku["lines"][0]} / {haiku["lines"][1]} / {haiku["lines"][2]}')
+
+    return len(new_haikus)
+
+
+def response_encoding(response) -> str:
+    '''The charset named in the Content-Type, or utf-8 when it is missing or unknown'''
+    try:
+        return codecs.lookup(response.charset).name
+    except (TypeError, LookupError):
+        return 'utf-8'
+
+
+async def read_text(response, max_bytes: int, metrics=NULL_METRICS) -> str:
+    '''Reads a response body like response.text(), refusing anything over max_bytes'''
+    if response.content_length is not None and response.content_length > max_bytes:
+        raise ArticleTooLargeError(f"Content-Length {response.content_length} over {max_bytes} bytes")
+
+    body = bytearray()
+    async for chunk in response.content.iter_chunked(64 * 1024):
+        body += chunk
+        if len(body) > max_bytes:
+            raise ArticleTooLargeError(f"Body over {max_bytes} bytes")
+
+    metrics.count('article bytes', len(body))
+    return body.decode(response_encoding(response), errors='replace')
+
+
+async def article_callback(session, logger, article_processor, hash_index, article: Article, max_bytes:int=MAX_ARTICLE_BYTES, metrics=NULL_METRICS, archive=None, live_blog=None):
+    '''Fetches, processes and saves an article. live_blog is the LiveBlog
+    being re-polled, and only its new or changed posts are searched for haiku.'''
+    article.sensitive = False
+    text = None
+    headers = {'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_11_5) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/50.0.2661.102 Safari/537.36'}
+
+    with metrics.timer('article fetch'):
+        async with session.get(article.url, headers=headers) as response:
+            text = await read_text(response, max_bytes, metrics)
+
+    if archive:
+        # gzipping and writing the page would hold up every other fetch on the loop
+        with metrics.timer('archive'):
+            await asyncio.get_running_loop().run_in_executor(None, archive.add, article.url, text)
+
+    meta, haikus = await article_processor.process(article.url, text, metrics, live_blogs.known_posts(live_blog))
+    apply_meta(article, meta)
+    with metrics.timer('db'):
+        haiku_count = await save_article(logger, hash_index, article, haikus)
+        if live_blog or meta['live_blog_posts']:
+            await live_blogs.update_live_blog(logger, live_blog, article, meta['live_blog_posts'])
+            # failures only count while they are in a row
+            await ArticleError.filter(article_id=article.id).delete()
+    metrics.count('articles')
+    metrics.count('haiku', haiku_count)
+
+    if meta['sensitive']:
+        logger.info(f"SKIP    {article.url} SENSITIVE")
+    else:
+        logger.info(f"FOUND {haiku_count} {article.url}")
 
 
-async def fetch_articles(session, logger, haiku_finder):
+async def record_article_error(logger, article: Article, err, live_blog=None, max_attempts:int=MAX_ARTICLE_ATTEMPTS):
+    '''Counts a failed fetch of article, marking it parsed once it has failed max_attempts times.
+    For a live blog being re-polled, the next poll is put off instead.'''
+    error, _ = await ArticleError.get_or_create(article_id=article.id)
+    error.attempts += 1
+    error.last_error = repr(err)
+    error.failed_at = timezone.now()
+    await error.save()
+
+    if live_blog is not None:
+        await live_blogs.poll_failed(logger, live_blog, article, error.attempts)
+    elif error.attempts >= max_attempts:
+        await Article.filter(id=article.id).update(parsed=True)
+        logger.info(f"SKIP    {article.url} after {error.attempts} errors")
+
+
+async def unparsed_articles(batch_size:int=ARTICLE_BATCH_SIZE, max_articles=None):
+    '''Yields unparsed articles in id order, reading batch_size rows at a time'''
+    last_id = 0
+    count = 0
+
+    while max_articles is None or count < max_articles:
+        batch = await Article.filter(parsed=False, id__gt=last_id).order_by('id').limit(batch_size)
+        if not batch:
+            return
+
+        for article in batch:
+            if max_articles is not None and count >= max_articles:
+                return
+            count += 1
+            yield article
+
+        last_id = batch[-1].id
+
+
+async def fetch_articles(session, logger, article_processor,
+                         hash_index=None,
+                         concurrency:int=ARTICLE_CONCURRENCY,
+                         batch_size:int=ARTICLE_BATCH_SIZE,
+                         max_articles=None,
+                         max_bytes:int=MAX_ARTICLE_BYTES,
+                         metrics=NULL_METRICS,
+                         archive=None):
+    '''Fetches and processes unparsed articles with a fixed number of workers.
+
+    The backlog is read from the database in batches and fed through a bounded
+    queue, so at most `concurrency` articles are downloaded or held in memory at
+    once no matter how many rows are waiting. max_articles caps a single run.
+    With an ArticleArchive, every page downloaded is archived for reprocess.py.
+    An article that fails MAX_ARTICLE_ATTEMPTS times is marked parsed and skipped.
+    Live blogs due for another poll are fetched again after the new articles.'''
     logger.info("ARTICLES start...")
-    unfetched_articles = await Article.filter(parsed=False).all()
-    await asyncio.gather(*[asyncio.create_task(article_callback(session, logger, haiku_finder, article)) for article in unfetched_articles], return_exceptions=True)
+    if hash_index is None:
+        with metrics.timer('db'):
+            hash_index = await HaikuHashIndex.load()
+
+    queue = asyncio.Queue(maxsize=concurrency)
+    stats_before = article_processor.stats.copy()
+
+    async def worker():
+        while True:
+            article, live_blog = await queue.get()
+            try:
+                await article_callback(session, logger, article_processor, hash_index, article, max_bytes, metrics, archive, live_blog)
+            except Exception as err:
+                metrics.count('article errors')
+                logger.info(f"ERROR   {article.url} {err!r}")
+                try:
+                    await record_article_error(logger, article, err, live_blog)
+                except Exception as record_err:
+                    logger.info(f"ERROR   recording {article.url} failure {record_err!r}")
+            finally:
+                queue.task_done()
+
+    workers = [asyncio.create_task(worker()) for _ in range(concurrency)]
+    try:
+        async for article in unparsed_articles(batch_size, max_articles):
+            await queue.put((article, None))
+
+        for live_blog in await live_blogs.due_live_blogs():
+            await queue.put((live_blog.article, live_blog))
+
+        await queue.join()
+    finally:
+        for w in workers:
+            w.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+
+    stage_counts = ', '.join(f"{count} {stage}" for stage, count in (article_processor.stats - stats_before).items())
+    logger.info(f"ARTICLES sentences: {stage_counts}")
+    rule_counts = awkward_rule_summary(metrics)
+    if rule_counts:
+        logger.info(f"ARTICLES awkward rules: {rule_counts}")
     logger.info("ARTICLES done")
@@ -0,0 +1,77 @@
+import os
+import json
+import hashlib
+from collections import Counter
+
+
+def content_digest(text: str) -> str:
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+
+class SectionCache:
+    '''On-disk cache of section page fetches, stored as JSON.
+
+    For each section URL it keeps the ETag and Last-Modified headers for
+    conditional requests, plus digests of the page body and of the article
+    links found on it. A page that is not modified, or whose links are the same
+    as last time, needs no parsing or database work.'''
+
+    def __init__(self, path=None):
+        self.path = path
+        self.entries = {}
+        self.pending = {}
+        self.stats = Counter()
+
+        if path and os.path.exists(path):
+            with open(path) as file:
+                self.entries = json.load(file)
+
+    def request_headers(self, url: str) -> dict:
+        entry = self.entries.get(url, {})
+        headers = {}
+
+        if entry.get('etag'):
+            headers['If-None-Match'] = entry['etag']
+        if entry.get('last_modified'):
+            headers['If-Modified-Since'] = entry['last_modified']
+
+        return headers
+
+    def same_body(self, url: str, body_digest: str) -> bool:
+        return self.entries.get(url, {}).get('body_digest') == body_digest
+
+    def same_links(self, url: str, links_digest: str) -> bool:
+        return self.entries.get(url, {}).get('links_digest') == links_digest
+
+    def update(self, url: str, response_headers, body_digest: str, links_digest: str):
+        '''Records a fetch, which only counts as cached once save() is called'''
+        self.pending[url] = {
+            'etag': response_headers.get('ETag'),
+            'last_modified': response_headers.get('Last-Modified'),
+            'body_digest': body_digest,
+            'links_digest': links_digest,
+        }
+
+    def record(self, outcome: str):
+        '''Counts one fetch as "not modified", "same page", "same links" or "changed"'''
+        self.stats[outcome] += 1
+
+    def summary(self) -> str:
+        hits = sum(count for outcome, count in self.stats.items() if outcome != 'changed')
+        details = ', '.join(f"{count} {outcome}" for outcome, count in sorted(self.stats.items()))
+        return f"{hits} hits, {self.stats['changed']} misses ({details})"
+
+    def save(self):
+        '''Commits pending fetches and writes the cache atomically.
+
+        Only call this once the links found by those fetches are in the database.'''
+        self.entries.update(self.pending)
+        self.pending = {}
+
+        if not self.path:
+            return
+
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w') as file:
+            json.dump(self.entries, file)
+        os.replace(tmp_path, self.path)
@@ -0,0 +1,199 @@
+import os
+import re
+import csv
+import mmap
+import struct
+import hashlib
+import tempfile
+import importlib.util
+from string import punctuation
+
+# The syllapy word list merged with our own counts, compiled into one file that
+# every process maps read-only instead of loading syllapy's JSON and the CSV.
+#
+# Layout, little-endian:
+#   magic (8 bytes), source digest (20 bytes), word count N (uint32)
+#   N + 1 uint32 offsets of each word in the word data, plus its end
+#   N syllable counts, one byte each
+#   word data: the UTF-8 words, sorted, back to back
+#
+# The source digest covers both word lists, so the file is rebuilt whenever
+# syllable_counts.csv is edited or a different syllapy is installed.
+#
+# The file lives in a per-user cache directory, SYLLABLE_DICT_PATH if set,
+# since the package directory may be read-only. When it can't be written there
+# either, the dictionary is compiled in memory for this process instead.
+MAGIC = b'NYTSYL01'
+HEADER = struct.Struct('<8s20sI')
+OFFSET = struct.Struct('<I')
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), 'data')
+CSV_PATH = os.path.join(DATA_DIR, 'syllable_counts.csv')
+CACHE_NAME = os.path.join('nyt_haiku', 'syllables.bin')
+
+NUMBERS = re.compile(r'\d')
+VOWELS = 'aeiouy'
+
+
+def default_path() -> str:
+    '''Where load keeps the compiled dictionary unless told otherwise'''
+    if os.getenv("SYLLABLE_DICT_PATH"):
+        return os.getenv("SYLLABLE_DICT_PATH")
+
+    cache_dir = os.getenv("XDG_CACHE_HOME") or os.path.expanduser(os.path.join('~', '.cache'))
+    if not os.path.isabs(cache_dir):
+        cache_dir = tempfile.gettempdir()
+    return os.path.join(cache_dir, CACHE_NAME)
+
+
+def syllapy_data_path() -> str:
+    '''Where syllapy keeps its word list, found without importing syllapy'''
+    return os.path.join(os.path.dirname(importlib.util.find_spec('syllapy').origin), 'data.json')
+
+
+def source_digest(csv_path=CSV_PATH) -> bytes:
+    digest = hashlib.sha1(MAGIC)
+    for path in (syllapy_data_path(), csv_path):
+        if path:
+            with open(path, 'rb') as file:
+                digest.update(file.read())
+    return digest.digest()
+
+
+def read_overrides(csv_path=CSV_PATH) -> dict:
+    '''Reads our word,count rows that add to or correct syllapy'''
+    overrides = {}
+    with open(csv_path, newline='') as file:
+        for row in csv.reader(file):
+            if len(row) == 2:
+                overrides[row[0].lower()] = int(row[1])
+    return overrides
+
+
+def compile_words(csv_path=CSV_PATH) -> bytes:
+    '''Compiles syllapy's words plus the CSV overrides into the dictionary file format.
+    With csv_path None, it only has syllapy's words.'''
+    import syllapy
+
+    words = dict(syllapy.WORD_DICT)
+    if csv_path:
+        words.update(read_overrides(csv_path))
+
+    entries = sorted((word.encode('utf-8'), count) for word, count in words.items())
+    offsets = [0]
+    for word, count in entries:
+        offsets.append(offsets[-1] + len(word))
+
+    return b''.join([HEADER.pack(MAGIC, source_digest(csv_path), len(entries)),
+                     struct.pack(f'<{len(offsets)}I', *offsets),
+                     bytes(count for word, count in entries)] +
+                    [word for word, count in entries])
+
+
+def build(path, csv_path=CSV_PATH):
+    '''Writes the dictionary compiled by compile_words to path'''
+    data = compile_words(csv_path)
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+
+    # Written under a temporary name, so processes starting at the same time never read a partial file
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_path, 'wb') as file:
+            file.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def heuristic_syllables(word: str) -> int:
+    '''Guesses syllables from vowel groups, the same way syllapy does for unknown words'''
+    syllable_count = 0
+    if word[0] in VOWELS:
+        syllable_count += 1
+    for index in range(1, len(word)):
+        if word[index] in VOWELS and word[index - 1] not in VOWELS:
+            syllable_count += 1
+    if word.endswith('e'):
+        syllable_count -= 1
+    if word.endswith('le') and len(word) > 2 and word[-3] not in VOWELS:
+        syllable_count += 1
+    return max(syllable_count, 1)
+
+
+class SyllableDictionary:
+    '''Read-only view of a compiled dictionary file, looked up by binary search.
+    Given data, it reads those bytes instead of mapping path.'''
+
+    def __init__(self, path=None, data=None):
+        self.path = path
+        if data is None:
+            with open(path, 'rb') as file:
+                data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.data = data
+
+        magic, self.digest, self.size = HEADER.unpack_from(self.data)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a syllable dictionary")
+
+        self.offsets_start = HEADER.size
+        self.counts_start = self.offsets_start + (self.size + 1) * OFFSET.size
+        self.words_start = self.counts_start + self.size
+
+    def __len__(self):
+        return self.size
+
+    def __contains__(self, word: str):
+        return self.lookup(word) is not None
+
+    def word_at(self, index: int) -> bytes:
+        start, end = struct.unpack_from('<2I', self.data, self.offsets_start + index * OFFSET.size)
+        return self.data[self.words_start + start:self.words_start + end]
+
+    def lookup(self, word: str):
+        '''Returns the syllables listed for word, or None if it is not listed'''
+        key = word.encode('utf-8')
+        low, high = 0, self.size
+        while low < high:
+            middle = (low + high) // 2
+            if self.word_at(middle) < key:
+                low = middle + 1
+            else:
+                high = middle
+
+        if low < self.size and self.word_at(low) == key:
+            return self.data[self.counts_start + low]
+        return None
+
+    def count(self, word: str) -> int:
+        '''Syllables in word, with the same rules as syllapy.count'''
+        word = word.strip().lower().strip(punctuation)
+        if not word or NUMBERS.search(word):
+            return 0
+
+        count = self.lookup(word)
+        if count is None:
+            return heuristic_syllables(word)
+        return count
+
+    def close(self):
+        if isinstance(self.data, mmap.mmap):
+            self.data.close()
+
+
+def load(path=None, csv_path=CSV_PATH) -> SyllableDictionary:
+    '''Maps the dictionary at path, default_path() if None, compiling it first if it is missing or out of date.
+    If it can't be written, the dictionary is compiled in memory instead.'''
+    path = path or default_path()
+    if os.path.exists(path):
+        with open(path, 'rb') as file:
+            header = file.read(HEADER.size)
+        if len(header) == HEADER.size and HEADER.unpack(header)[:2] == (MAGIC, source_digest(csv_path)):
+            return SyllableDictionary(path)
+
+    try:
+        build(path, csv_path)
+    except OSError:
+        return SyllableDictionary(data=compile_words(csv_path))
+    return SyllableDictionary(path)
@@ -0,0 +1,54 @@
+import re
+
+WORD_PATTERN = re.compile(r'\w+')
+
+# Trie key marking the end of a phrase, never a word
+END = None
+
+
+def normalize(text: str):
+    '''Lowercased words of the text, so matching is case-insensitive and on word boundaries'''
+    return WORD_PATTERN.findall(text.lower())
+
+
+class TermIndex:
+    '''Word-level trie of phrases of different kinds (e.g. sensitive terms).
+
+    Phrases are stored as sequences of normalized words, so a match always starts
+    and ends on a word boundary and searching a text is one pass over its words,
+    however many phrases are indexed. Words only match exactly, so inflected
+    forms of a phrase are indexed as phrases of their own.'''
+
+    def __init__(self):
+        self.root = {}
+
+    def add(self, phrase: str, kind: str):
+        words = normalize(phrase)
+        if not words:
+            return
+
+        node = self.root
+        for word in words:
+            node = node.setdefault(word, {})
+        node.setdefault(END, {}).setdefault(kind, phrase)
+
+    def search(self, text: str, kind: str):
+        '''Returns the leftmost, longest phrase of this kind that occurs in the text, or None'''
+        if not text:
+            return None
+
+        words = normalize(text)
+        for start in range(len(words)):
+            node = self.root
+            found = None
+
+            for index in range(start, len(words)):
+                node = node.get(words[index])
+                if node is None:
+                    break
+                found = node.get(END, {}).get(kind, found)
+
+            if found:
+                return found
+
+        return None
@@ -0,0 +1,219 @@
+import os
+import json
+import time
+import asyncio
+from collections import deque
+
+from tortoise.transactions import in_transaction
+from peony.exceptions import HTTPTooManyRequests
+
+from nyt_haiku.models import Haiku
+from nyt_haiku.metrics import Metrics, NULL_METRICS
+
+# Most tweet ids the v2 tweets lookup takes in one request
+BATCH_SIZE = 100
+CONCURRENCY = 4
+
+# GET /2/tweets allows 300 requests per 15 minute window with user auth
+RATE_LIMIT = 300
+RATE_WINDOW = 15 * 60
+
+# Lookups tried for a batch before giving up on it for this run
+MAX_ATTEMPTS = 3
+
+STATS_UPDATE = 'UPDATE "haiku" SET "favorite_count" = ?, "retweet_count" = ?, "quote_count" = ? WHERE "id" = ?'
+
+
+class TokenBucket:
+    '''Spaces out API requests to rate tokens a second, allowing bursts of up to capacity.
+
+    update() takes the rate limit headers of each response, so a limit the
+    server reports as lower than ours, or used up by another client, wins.'''
+
+    def __init__(self, rate: float, capacity: int, clock=time.time, sleep=asyncio.sleep):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.clock = clock
+        self.sleep = sleep
+        self.updated_at = clock()
+        self.paused_until = 0
+        self.lock = asyncio.Lock()
+
+    def refill(self):
+        now = self.clock()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    async def acquire(self):
+        async with self.lock:
+            while True:
+                self.refill()
+                if self.paused_until > self.updated_at:
+                    await self.sleep(self.paused_until - self.updated_at)
+                elif self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                else:
+                    await self.sleep((1 - self.tokens) / self.rate)
+
+    def update(self, headers):
+        headers = {key.lower(): value for key, value in headers.items()}
+        if 'x-rate-limit-remaining' not in headers:
+            return
+
+        self.refill()
+        remaining = int(headers['x-rate-limit-remaining'])
+        self.tokens = min(self.tokens, remaining)
+        if remaining == 0 and 'x-rate-limit-reset' in headers:
+            self.paused_until = max(self.paused_until, int(headers['x-rate-limit-reset']))
+
+
+class Checkpoint:
+    '''The id up to which every batch has been refreshed, kept in path so an interrupted run can resume.
+
+    Batches finish out of order, so it only moves past a batch once every
+    batch before it is done. A batch that failed holds it in place.'''
+
+    def __init__(self, path=None, last_id: int = 0):
+        self.path = path
+        self.last_id = last_id
+        self.pending = deque()
+
+    @classmethod
+    def load(cls, path=None):
+        last_id = 0
+        if path and os.path.exists(path):
+            with open(path) as file:
+                last_id = json.load(file)['last_id']
+        return cls(path, last_id)
+
+    def start(self, end_id: int) -> list:
+        batch = [end_id, None]
+        self.pending.append(batch)
+        return batch
+
+    def finish(self, batch: list, ok: bool = True):
+        batch[1] = ok
+        moved = False
+        while self.pending and self.pending[0][1]:
+            self.last_id = self.pending.popleft()[0]
+            moved = True
+        if moved:
+            self.save()
+
+    @property
+    def stalled(self) -> bool:
+        return bool(self.pending) and self.pending[0][1] is False
+
+    def save(self):
+        if not self.path:
+            return
+
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w') as file:
+            json.dump({'last_id': self.last_id}, file)
+        os.replace(tmp_path, self.path)
+
+    def clear(self):
+        if self.path and os.path.exists(self.path):
+            os.remove(self.path)
+
+
+def fetch_batch(after_id: int, limit: int = BATCH_SIZE):
+    '''The next limit tweeted haiku after after_id, by primary key instead of OFFSET'''
+    return Haiku.filter(tweet_id__not_isnull=True, id__gt=after_id).order_by('id').limit(limit) \
+        .values('id', 'tweet_id', 'favorite_count', 'retweet_count', 'quote_count')
+
+
+def change_in_statistics(record, tweet) -> bool:
+    tweet_stats = tweet["public_metrics"]
+    return record["retweet_count"] != tweet_stats["retweet_count"] or record["favorite_count"] != tweet_stats["like_count"] or record["quote_count"] != tweet_stats["quote_count"]
+
+
+async def lookup_batch(logger, lookup, bucket: TokenBucket, tweet_ids, metrics: Metrics):
+    '''Fetches the tweets for tweet_ids within the rate limit, returning None if every attempt failed'''
+    for _ in range(MAX_ATTEMPTS):
+        await bucket.acquire()
+        try:
+            with metrics.timer('stats lookup'):
+                response = await lookup(tweet_ids)
+        except HTTPTooManyRequests as err:
+            metrics.count('stats rate limited')
+            logger.info("STATS rate limited, waiting for the reset")
+            if err.response is not None:
+                bucket.update(err.response.headers)
+            continue
+        except Exception as err:
+            metrics.count('stats errors')
+            logger.info(f"ERROR   stats lookup {err!r}")
+            continue
+
+        bucket.update(response.headers)
+        return response['data'] if 'data' in response else []
+
+    return None
+
+
+async def update_batch(logger, lookup, bucket: TokenBucket, records, metrics: Metrics) -> bool:
+    '''Looks up one batch of tweets and writes the counts that changed in one transaction'''
+    tweets = await lookup_batch(logger, lookup, bucket, [r["tweet_id"] for r in records], metrics)
+    if tweets is None:
+        return False
+
+    records_by_id = {r["tweet_id"]: r for r in records}
+    updates = []
+    for t in tweets:
+        record = records_by_id[t["id"]]
+        if change_in_statistics(record, t):
+            tweet_stats = t["public_metrics"]
+            logger.info(f"TWEET {t['id']} FAVES: {record['favorite_count']} -> {tweet_stats['like_count']} RT: {record['retweet_count']} -> {tweet_stats['retweet_count']} QT: {record['quote_count']} -> {tweet_stats['quote_count']}")
+            updates.append((tweet_stats['like_count'], tweet_stats['retweet_count'], tweet_stats['quote_count'], record["id"]))
+
+    if updates:
+        async with in_transaction() as conn:
+            await conn.execute_many(STATS_UPDATE, updates)
+    metrics.count('stats batches')
+    metrics.count('stats tweets', len(records))
+    metrics.count('stats changed', len(updates))
+    return True
+
+
+async def refresh_stats(logger, lookup, bucket: TokenBucket, checkpoint: Checkpoint,
+                        batch_size: int = BATCH_SIZE, concurrency: int = CONCURRENCY, metrics=NULL_METRICS) -> bool:
+    '''Refreshes the counts of every tweeted haiku after checkpoint.last_id, returning whether all batches succeeded.
+
+    lookup(tweet_ids) is awaited for each batch and returns the tweets API
+    response. Up to concurrency lookups run at once, all drawing on bucket.'''
+    queue = asyncio.Queue(maxsize=concurrency)
+
+    async def worker():
+        while True:
+            item = await queue.get()
+            if item is None:
+                return
+            records, batch = item
+            try:
+                checkpoint.finish(batch, await update_batch(logger, lookup, bucket, records, metrics))
+            except Exception as err:
+                logger.info(f"ERROR   stats batch ending {batch[0]} {err!r}")
+                checkpoint.finish(batch, False)
+
+    workers = [asyncio.create_task(worker()) for _ in range(concurrency)]
+    try:
+        after_id = checkpoint.last_id
+        while True:
+            records = await fetch_batch(after_id, batch_size)
+            if not records:
+                break
+            after_id = records[-1]["id"]
+            await queue.put((records, checkpoint.start(after_id)))
+
+        for _ in workers:
+            await queue.put(None)
+        await asyncio.gather(*workers)
+    finally:
+        for task in workers:
+            task.cancel()
+
+    return not checkpoint.stalled
@@ -1,10 +1,13 @@
 import os
 
 from tortoise import Tortoise
-from peony import PeonyClient
+from tortoise.transactions import in_transaction
 from dateutil import parser
 
-from nyt_haiku import models
+from nyt_haiku import models, candidates
+from nyt_haiku.metrics import NULL_METRICS
+
+COUNTS_UPDATE = 'UPDATE "haiku" SET "favorite_count" = ?, "retweet_count" = ? WHERE "id" = ?'
 
 def tweet_from_haiku(haiku: models.Haiku):
     return f"{haiku.line0}\n{haiku.line1}\n{haiku.line2}\n\n{haiku.article.url}"
@@ -14,23 +17,53 @@ def change_in_counts(haiku: models.Haiku, favorite_count: int, retweet_count: in
     return haiku.favorite_count is None or haiku.retweet_count is None or favorite_count > haiku.favorite_count or retweet_count > haiku.retweet_count
 
 
-async def tweet(session, logger):
+async def reconcile_timeline(logger, timeline, metrics=NULL_METRICS) -> int:
+    '''Copies the counts from timeline tweets onto their haiku, returning how many changed.
+
+    The haiku are looked up with one query and the changes written in one transaction.'''
+    tweets = {t['id_str']: t for t in timeline}
+    if not tweets:
+        return 0
+
+    updates = []
+    for haiku in await models.Haiku.filter(tweet_id__in=list(tweets)):
+        t = tweets[haiku.tweet_id]
+        favorite_count = t['favorite_count']
+        retweet_count = t['retweet_count']
+
+        if change_in_counts(haiku, favorite_count, retweet_count):
+            logger.info(f"TWEET {haiku.tweet_id} FAVES: {haiku.favorite_count} -> {favorite_count} RT: {haiku.retweet_count} -> {retweet_count}")
+            updates.append((favorite_count, retweet_count, haiku.id))
+
+    if updates:
+        async with in_transaction() as conn:
+            await conn.execute_many(COUNTS_UPDATE, updates)
+    metrics.count('tweet counts changed', len(updates))
+    return len(updates)
+
+
+async def tweet(session, logger, metrics=NULL_METRICS):
+    # Imported here so runs with Twitter disabled never load peony
+    from peony import PeonyClient
+
     twitter_client = PeonyClient(consumer_key=os.getenv("TWITTER_CONSUMER_KEY"),
                                  consumer_secret=os.getenv("TWITTER_CONSUMER_SECRET"),
                                  access_token=os.getenv("TWITTER_ACCESS_TOKEN"),
                                  access_token_secret=os.getenv("TWITTER_ACCESS_TOKEN_SECRET"),
                                  session=session)
 
-    # Need to do a manual connection to order by random
+    # A random untweeted haiku from an article that hasn't been tweeted in the last two hours
     conn = Tortoise.get_connection("default")
-    haiku_rows = await conn.execute_query_dict("select id from haiku where tweet_id IS NULL AND article_id NOT IN (select article_id from haiku where tweet_id IS NOT NULL and tweeted_at > datetime('now','-2 hour')) ORDER BY RANDOM() limit 1")
+    haiku_id = await candidates.next_candidate(conn)
 
-    if len(haiku_rows) > 0:
-        haiku = await models.Haiku.get(id=haiku_rows[0]["id"])
+    if haiku_id is not None:
+        haiku = await models.Haiku.get(id=haiku_id)
         await haiku.fetch_related('article')
         haiku.tweet = tweet_from_haiku(haiku)
 
-        response = await twitter_client.api.statuses.update.post(status=haiku.tweet, trim_user=True)
+        with metrics.timer('tweet'):
+            response = await twitter_client.api.statuses.update.post(status=haiku.tweet, trim_user=True)
+        metrics.count('tweets')
         haiku.tweet_id = response['id_str']
         haiku.tweeted_at = parser.parse(response['created_at'])
 
@@ -39,17 +72,8 @@ async def tweet(session, logger):
 
         await haiku.save()
 
-    response = await twitter_client.api.statuses.user_timeline.get(count=200, screen_name=os.getenv("TWITTER_USERNAME"), trim_user=True)
-    for t in response:
-        haiku = await models.Haiku.filter(tweet_id=t['id_str']).first()
-        if haiku:
-            favorite_count = t['favorite_count']
-            retweet_count = t['retweet_count']
-
-            if change_in_counts(haiku, favorite_count, retweet_count):
-                logger.info(f"TWEET {t['id_str']} FAVES: {haiku.favorite_count} -> {favorite_count} RT: {haiku.retweet_count} -> {retweet_count}")
-                haiku.favorite_count = favorite_count
-                haiku.retweet_count = retweet_count
-                await haiku.save()
+    with metrics.timer('tweet timeline'):
+        response = await twitter_client.api.statuses.user_timeline.get(count=200, screen_name=os.getenv("TWITTER_USERNAME"), trim_user=True)
+    await reconcile_timeline(logger, response, metrics)
 
     logger.info("TWEET STATISTICS updated")
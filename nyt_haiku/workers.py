@@ -0,0 +1,157 @@
+import os
+import asyncio
+import logging
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+from nyt_haiku import nyt
+from nyt_haiku.archive import ArticleArchive
+from nyt_haiku.haiku import HaikuFinder
+from nyt_haiku.metrics import Metrics, NULL_METRICS
+
+# Set in each worker process by init_worker
+WORKER_HAIKU_FINDER = None
+WORKER_HTML_PARSER = nyt.DEFAULT_HTML_PARSER
+WORKER_PREFILTER = False
+
+
+def pool_size(setting) -> int:
+    '''Parses a worker count setting: 0 for inline processing, N, or "auto" for one per core'''
+    if not setting:
+        return 0
+
+    if setting == 'auto':
+        return os.cpu_count() or 1
+
+    return max(int(setting), 0)
+
+
+def init_worker(segmenter, html_parser, prefilter):
+    '''Preloads spaCy and the moderator once per worker process'''
+    global WORKER_HAIKU_FINDER, WORKER_HTML_PARSER, WORKER_PREFILTER
+    WORKER_HAIKU_FINDER = HaikuFinder(segmenter=segmenter)
+    nyt.article_moderator()
+    WORKER_HTML_PARSER = html_parser
+    WORKER_PREFILTER = prefilter
+
+
+def process_article_in_worker(url: str, body_html: str, known_posts=None):
+    '''Processes an article, sending back its timings with the results'''
+    metrics = Metrics()
+    meta, haikus, stats = nyt.process_article(logging.getLogger(), WORKER_HAIKU_FINDER, url, body_html, WORKER_HTML_PARSER, WORKER_PREFILTER, metrics, known_posts)
+    return meta, haikus, stats, metrics
+
+
+def process_archived_page(logger, haiku_finder, archive: ArticleArchive, url: str, digest: str, html_parser, prefilter):
+    '''Returns (url, meta, haikus, None) for an archived page, or (url, None, None, error) if it can't be processed'''
+    try:
+        meta, haikus, stats = nyt.process_article(logger, haiku_finder, url, archive.read(digest), html_parser, prefilter)
+    except Exception as err:
+        return url, None, None, repr(err)
+    return url, meta, haikus, None
+
+
+def process_archived_article(archive_path: str, url: str, digest: str):
+    '''Processes an archived page, reading it in the worker so only the digest goes over'''
+    return process_archived_page(logging.getLogger(), WORKER_HAIKU_FINDER, ArticleArchive(archive_path), url, digest, WORKER_HTML_PARSER, WORKER_PREFILTER)
+
+
+def skip_failed_pages(logger, results):
+    for url, meta, haikus, error in results:
+        if error is None:
+            yield url, meta, haikus
+        else:
+            logger.info(f"ERROR   {url} {error}")
+
+
+def reprocess_archive(archive: ArticleArchive, size: int, segmenter='full', html_parser=nyt.DEFAULT_HTML_PARSER, prefilter=False, haiku_finder=None):
+    '''Yields (url, meta, haikus) for the latest archived page of every URL,
+    across a pool of size worker processes, or inline when size is 0 with
+    haiku_finder or a new HaikuFinder for segmenter. Pages that can't be
+    processed, like archived error pages, are logged and skipped.'''
+    logger = logging.getLogger()
+    entries = archive.entries()
+    urls = list(entries)
+    digests = [entries[url] for url in urls]
+    paths = [archive.path] * len(urls)
+
+    if not size:
+        if haiku_finder is None:
+            haiku_finder = HaikuFinder(segmenter=segmenter)
+        yield from skip_failed_pages(logger, (process_archived_page(logger, haiku_finder, archive, url, digest, html_parser, prefilter)
+                                              for url, digest in zip(urls, digests)))
+        return
+
+    with ProcessPoolExecutor(max_workers=size, initializer=init_worker, initargs=(segmenter, html_parser, prefilter)) as executor:
+        yield from skip_failed_pages(logger, executor.map(process_archived_article, paths, urls, digests, chunksize=8))
+
+
+class ArticleProcessor:
+    '''Turns article HTML into metadata and haiku, adding up how many sentences each stage eliminates'''
+
+    def __init__(self):
+        self.stats = Counter()
+
+    async def process(self, url: str, body_html: str, metrics=NULL_METRICS, known_posts=None):
+        meta, haikus, stats = await self.process_article(url, body_html, metrics, known_posts)
+        self.stats.update(stats)
+        return meta, haikus
+
+    def close(self):
+        pass
+
+
+class InlineArticleProcessor(ArticleProcessor):
+    '''Parses articles and finds haiku on the event loop itself.
+
+    Without a haiku_finder, one is made for segmenter on the first article, so
+    a run with nothing to parse never loads spaCy. It is built in a thread, so
+    the downloads already under way carry on while spaCy loads.'''
+
+    def __init__(self, logger, haiku_finder=None, html_parser=nyt.DEFAULT_HTML_PARSER, prefilter=False, segmenter='full'):
+        super().__init__()
+        self.logger = logger
+        self.haiku_finder = haiku_finder
+        self.html_parser = html_parser
+        self.prefilter = prefilter
+        self.segmenter = segmenter
+        self.loading = asyncio.Lock()
+
+    async def load_haiku_finder(self) -> HaikuFinder:
+        async with self.loading:
+            if self.haiku_finder is None:
+                loop = asyncio.get_running_loop()
+                self.haiku_finder = await loop.run_in_executor(None, HaikuFinder, self.segmenter)
+        return self.haiku_finder
+
+    async def process_article(self, url: str, body_html: str, metrics, known_posts):
+        if self.haiku_finder is None:
+            await self.load_haiku_finder()
+        return nyt.process_article(self.logger, self.haiku_finder, url, body_html, self.html_parser, self.prefilter, metrics, known_posts)
+
+
+class PoolArticleProcessor(ArticleProcessor):
+    '''Parses articles and finds haiku in a pool of worker processes.
+
+    Only the HTML goes out and only metadata and haiku candidates come back,
+    so the event loop keeps downloading while articles are being parsed.'''
+
+    def __init__(self, size: int, segmenter='full', html_parser=nyt.DEFAULT_HTML_PARSER, prefilter=False):
+        super().__init__()
+        self.executor = ProcessPoolExecutor(max_workers=size, initializer=init_worker, initargs=(segmenter, html_parser, prefilter))
+
+    async def process_article(self, url: str, body_html: str, metrics, known_posts):
+        loop = asyncio.get_running_loop()
+        meta, haikus, stats, worker_metrics = await loop.run_in_executor(self.executor, process_article_in_worker, url, body_html, known_posts)
+        metrics.merge(worker_metrics)
+        return meta, haikus, stats
+
+    def close(self):
+        self.executor.shutdown()
+
+
+def article_processor(logger, workers: int, segmenter='full', html_parser=nyt.DEFAULT_HTML_PARSER, prefilter=False):
+    if workers:
+        return PoolArticleProcessor(workers, segmenter, html_parser, prefilter)
+
+    return InlineArticleProcessor(logger, html_parser=html_parser, prefilter=prefilter, segmenter=segmenter)
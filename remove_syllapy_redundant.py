@@ -1,13 +1,17 @@
 import os
-import csv
-import syllapy
-
-syllable_file_path = os.path.join(os.path.dirname(__file__), 'nyt_haiku', 'data', 'syllable_counts.csv')
-with open(syllable_file_path, newline='') as file:
-    reader = csv.reader(file)
-    for row in reader:
-        if len(row) == 2:
-            word = row[0].lower()
-            count = int(row[1])
-            if count != syllapy.count(word):
-                print(f"{word},{count}")
+import tempfile
+
+from nyt_haiku import syllable_dict
+
+# Prints the rows of syllable_counts.csv that syllapy doesn't already count the
+# same way, comparing against a compiled dictionary of syllapy's words alone.
+with tempfile.TemporaryDirectory() as tmp_dir:
+    syllapy_path = os.path.join(tmp_dir, 'syllapy.bin')
+    syllable_dict.build(syllapy_path, csv_path=None)
+    syllapy_words = syllable_dict.SyllableDictionary(syllapy_path)
+
+    for word, count in syllable_dict.read_overrides().items():
+        if count != syllapy_words.count(word):
+            print(f"{word},{count}")
+
+    syllapy_words.close()
@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+"""Finds haiku again in the archived article pages and compares them with the
+haiku table, for checking changes to the syllable counts or moderation rules.
+
+Reads ARCHIVE_PATH, written by main.py, and never touches the network or
+changes the database. Uses every core unless ARTICLE_WORKERS says otherwise.
+"""
+import os
+
+import asyncio
+import logging
+import logging.config
+from dotenv import load_dotenv
+from nyt_haiku import models, nyt, workers
+from nyt_haiku.archive import ArticleArchive, saved_haikus, diff_haikus
+
+load_dotenv()
+
+logger = logging.getLogger()
+logging.config.fileConfig('logconfig.ini')
+
+
+def format_lines(lines):
+    return ' / '.join(lines)
+
+
+async def main():
+    logger.info("Starting reprocessing...")
+    archive = ArticleArchive(os.getenv("ARCHIVE_PATH"))
+    size = workers.pool_size(os.getenv("ARTICLE_WORKERS", "auto"))
+
+    found = {}
+    urls = []
+    for url, meta, haikus in workers.reprocess_archive(archive, size,
+                                                       segmenter=os.getenv("HAIKU_SEGMENTER", "full"),
+                                                       html_parser=os.getenv("HTML_PARSER", nyt.DEFAULT_HTML_PARSER),
+                                                       prefilter=os.getenv("HAIKU_PREFILTER") == 'true'):
+        urls.append(url)
+        for haiku in haikus:
+            found.setdefault(haiku["hash"], (url, haiku["lines"]))
+
+    await models.init(os.getenv("DB_PATH"))
+    saved = await saved_haikus(urls, found, nyt.URL_CHUNK_SIZE)
+    await models.close_db()
+
+    diff = diff_haikus(saved, found)
+    for hash in diff['new']:
+        logger.info(f"NEW     {hash} {found[hash][0]}: {format_lines(found[hash][1])}")
+    for hash in diff['removed']:
+        logger.info(f"REMOVED {hash} {saved[hash][0]}: {format_lines(saved[hash][1])}")
+    for hash in diff['changed']:
+        logger.info(f"CHANGED {hash} {found[hash][0]}: {format_lines(saved[hash][1])} -> {format_lines(found[hash][1])}")
+
+    logger.info(f"{len(urls)} articles, {len(found)} haiku: {len(diff['new'])} new, {len(diff['removed'])} removed, {len(diff['changed'])} changed")
+    logger.info("Ending reprocessing...")
+
+asyncio.run(main())
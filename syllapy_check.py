@@ -34,9 +34,11 @@ if __name__ == "__main__":
 
     haikus = haiku.find_haikus_in_article(body)
 
+    # Words marked * are guessed from their vowels, not listed in the syllable dictionary
     print("\n\nTERMS")
     for word in sorted(words.keys()):
-        print(f"{word}: {words[word]}")
+        guessed = '' if word in haiku.syllables else ' *'
+        print(f"{word}: {words[word]}{guessed}")
 
     print("\n\nHAIKU")
     for haiku in haikus:
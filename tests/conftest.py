@@ -0,0 +1,12 @@
+import os
+import pytest_asyncio
+
+from nyt_haiku import models
+
+
+@pytest_asyncio.fixture
+async def db(tmp_path):
+    await models.init(os.path.join(tmp_path, 'test.db'))
+    await models.setup_db()
+    yield
+    await models.close_db()
@@ -0,0 +1,97 @@
+import os
+import logging
+import pytest
+from concurrent.futures import ThreadPoolExecutor
+
+from nyt_haiku import nyt, workers
+from nyt_haiku.archive import ArticleArchive, saved_haikus, diff_haikus
+from nyt_haiku.haiku import HaikuFinder
+from nyt_haiku.models import Article, Haiku
+
+logger = logging.getLogger(__name__)
+
+
+def sample_html(sample='article.html'):
+    with open(os.path.join(os.path.dirname(__file__), 'samples', sample)) as file:
+        return file.read()
+
+
+def test_archive_is_content_addressed(tmp_path):
+    archive = ArticleArchive(str(tmp_path))
+    first = archive.add('http://nytimes.com/a', '<p>one</p>')
+    assert archive.add('http://nytimes.com/a', '<p>one</p>') == first
+    assert archive.add('http://nytimes.com/b', '<p>one</p>') == first
+    second = archive.add('http://nytimes.com/a', '<p>two</p>')
+
+    assert len(list(archive.read_index())) == 3
+    assert len(list((tmp_path / 'objects').glob('*/*.html.gz'))) == 2
+    assert archive.read(first) == '<p>one</p>'
+
+    reopened = ArticleArchive(str(tmp_path))
+    assert reopened.entries() == {'http://nytimes.com/a': second, 'http://nytimes.com/b': first}
+    reopened.add('http://nytimes.com/b', '<p>one</p>')
+    assert len(list(reopened.read_index())) == 3
+
+
+def test_archive_skips_partial_index_line(tmp_path):
+    archive = ArticleArchive(str(tmp_path))
+    digest = archive.add('http://nytimes.com/a', '<p>one</p>')
+    with open(archive.index_path, 'a') as file:
+        file.write('{"url": "http://nytimes.com/b", "dig')
+
+    assert archive.entries() == {'http://nytimes.com/a': digest}
+
+
+def test_archive_add_from_threads(tmp_path):
+    archive = ArticleArchive(str(tmp_path))
+    pages = [(f'http://nytimes.com/{i}', f'<p>{i % 5}</p>') for i in range(40)]
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        list(executor.map(lambda page: archive.add(*page), pages + pages))
+
+    assert len(list(archive.read_index())) == 40
+    assert len(list((tmp_path / 'objects').glob('*/*.html.gz'))) == 5
+    assert not list((tmp_path / 'objects').glob('*/*.tmp'))
+
+
+def test_reprocess_archive_inline(tmp_path):
+    archive = ArticleArchive(str(tmp_path))
+    html = sample_html()
+    archive.add('http://nytimes.com/a', html)
+
+    haiku_finder = HaikuFinder(segmenter='parser')
+    results = list(workers.reprocess_archive(archive, 0, haiku_finder=haiku_finder))
+    meta, haikus, stats = nyt.process_article(logger, haiku_finder, 'http://nytimes.com/a', html)
+
+    assert results == [('http://nytimes.com/a', meta, haikus)]
+
+
+
+@pytest.mark.parametrize("size", [0, 1])
+def test_reprocess_archive_skips_bad_pages(tmp_path, caplog, size):
+    archive = ArticleArchive(str(tmp_path))
+    archive.add('http://nytimes.com/missing', '<html><body><h1>Page Not Found</h1></body></html>')
+    archive.add('http://nytimes.com/a', sample_html())
+
+    haiku_finder = HaikuFinder(segmenter='parser') if not size else None
+    with caplog.at_level(logging.INFO):
+        results = list(workers.reprocess_archive(archive, size, segmenter='parser', haiku_finder=haiku_finder))
+
+    assert [url for url, meta, haikus in results] == ['http://nytimes.com/a']
+    assert any(record.getMessage().startswith('ERROR   http://nytimes.com/missing AttributeError') for record in caplog.records)
+
+def test_diff_haikus():
+    saved = {'a': ('u1', ['x', 'y', 'z']), 'b': ('u1', ['x', 'y', 'z']), 'c': ('u2', ['x', 'y', 'z'])}
+    found = {'b': ('u1', ['x', 'y', 'z']), 'c': ('u2', ['x y', 'z', '']), 'd': ('u2', ['x', 'y', 'z'])}
+    assert diff_haikus(saved, found) == {'new': ['d'], 'removed': ['a'], 'changed': ['c']}
+
+
+@pytest.mark.asyncio
+async def test_saved_haikus(db):
+    archived = await Article.create(url='http://nytimes.com/a')
+    other = await Article.create(url='http://nytimes.com/b')
+    await Haiku.create(hash='1', article=archived, sentence='s1', line0='a', line1='b', line2='c')
+    await Haiku.create(hash='2', article=other, sentence='s2', line0='d', line1='e', line2='f')
+    await Haiku.create(hash='3', article=other, sentence='s3', line0='g', line1='h', line2='i')
+
+    saved = await saved_haikus(['http://nytimes.com/a'], ['2'], chunk_size=1)
+    assert saved == {'1': ('http://nytimes.com/a', ['a', 'b', 'c']), '2': ('http://nytimes.com/b', ['d', 'e', 'f'])}
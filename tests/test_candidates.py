@@ -0,0 +1,93 @@
+import random
+import pytest
+from tortoise import Tortoise, timezone
+
+from nyt_haiku import candidates, migrations
+from nyt_haiku.models import Article, Haiku
+
+
+async def make_haikus(count, articles=3):
+    article_list = [await Article.create(url=f'http://nytimes.com/{i}') for i in range(articles)]
+    return [await Haiku.create(hash=str(i), article=article_list[i % articles], sentence=f's{i}', line0='a', line1='b', line2='c')
+            for i in range(count)]
+
+
+async def candidate_rows():
+    conn = Tortoise.get_connection("default")
+    return await conn.execute_query_dict('SELECT "slot", "haiku_id" FROM "tweet_candidate" ORDER BY "slot"')
+
+
+async def assert_pool_matches_untweeted():
+    rows = await candidate_rows()
+    untweeted = await Haiku.filter(tweet_id__isnull=True).values_list('id', flat=True)
+    assert [row["slot"] for row in rows] == list(range(1, len(rows) + 1))
+    assert sorted(row["haiku_id"] for row in rows) == sorted(untweeted)
+
+
+@pytest.mark.asyncio
+async def test_triggers_keep_slots_dense(db):
+    haikus = await make_haikus(10)
+    await assert_pool_matches_untweeted()
+
+    # first, middle and last slots
+    for haiku in [haikus[0], haikus[5], haikus[9]]:
+        haiku.tweet_id = f'tweet{haiku.id}'
+        await haiku.save()
+        await assert_pool_matches_untweeted()
+
+    await haikus[3].delete()
+    await haikus[5].delete()
+    await assert_pool_matches_untweeted()
+
+    haikus[0].tweet_id = None
+    await haikus[0].save()
+    await assert_pool_matches_untweeted()
+
+    for haiku in await Haiku.filter(tweet_id__isnull=True):
+        haiku.tweet_id = 'done'
+        await haiku.save()
+    assert await candidate_rows() == []
+
+
+@pytest.mark.asyncio
+async def test_migration_fills_pool(db):
+    await make_haikus(5)
+    await Haiku.filter(hash='2').update(tweet_id='tweet2')
+
+    conn = Tortoise.get_connection("default")
+    await conn.execute_script('DROP TABLE "tweet_candidate"; PRAGMA user_version = 2')
+    await migrations.migrate()
+    await assert_pool_matches_untweeted()
+    assert len(await candidate_rows()) == 4
+
+
+@pytest.mark.asyncio
+async def test_next_candidate(db):
+    conn = Tortoise.get_connection("default")
+    assert await candidates.next_candidate(conn) is None
+
+    haikus = await make_haikus(9, articles=3)
+    rng = random.Random(1)
+    picked = set()
+    for _ in range(200):
+        picked.add(await candidates.next_candidate(conn, rng))
+    assert picked == set(haiku.id for haiku in haikus)
+
+    # Article 0 goes into its cooldown
+    haikus[0].tweet_id = 'tweet0'
+    haikus[0].tweeted_at = timezone.now()
+    await haikus[0].save()
+    cooling_article = haikus[0].article_id
+    assert await candidates.cooling_down(conn) == {cooling_article}
+
+    picked = set()
+    for _ in range(200):
+        picked.add(await candidates.next_candidate(conn, rng))
+    assert picked == set(haiku.id for haiku in haikus if haiku.article_id != cooling_article)
+
+    # Weighting and the fallback query
+    favorite = haikus[4].id
+    only_favorite = lambda candidate: 1.0 if candidate["haiku_id"] == favorite else 0.0
+    assert await candidates.next_candidate(conn, rng, weight=only_favorite, attempts=1000) == favorite
+    for _ in range(20):
+        assert await candidates.next_candidate(conn, rng, attempts=0) not in (None, haikus[3].id, haikus[6].id)
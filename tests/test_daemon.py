@@ -0,0 +1,60 @@
+import json
+import asyncio
+import logging
+import pytest
+
+from nyt_haiku.daemon import Daemon, Job
+
+logger = logging.getLogger(__name__)
+
+
+@pytest.mark.asyncio
+async def test_daemon_runs_jobs_on_schedule(tmp_path):
+    runs = []
+
+    async def sections(metrics):
+        runs.append('sections')
+        metrics.count('new articles', 2)
+
+    async def articles(metrics):
+        runs.append('articles')
+        with metrics.timer('parse'):
+            pass
+        if runs.count('articles') == 3:
+            daemon.stop()
+
+    async def broken(metrics):
+        raise ValueError("boom")
+
+    status_path = tmp_path / 'status.json'
+    daemon = Daemon(logger, [Job('sections', 60, sections), Job('articles', 0.01, articles), Job('tweet', 60, broken)], str(status_path))
+    await asyncio.wait_for(daemon.run(), 5)
+
+    assert runs == ['sections', 'articles', 'articles', 'articles']
+
+    status = json.loads(status_path.read_text())
+    assert status['running'] is None
+    assert status['stopping']
+    assert status['jobs']['sections']['last']['metrics']['counters'] == {'new articles': 2}
+    assert status['jobs']['articles']['runs'] == 3
+    assert status['jobs']['articles']['last']['metrics']['timers']['parse']['count'] == 1
+    assert status['jobs']['tweet']['errors'] == 1
+    assert status['jobs']['tweet']['last']['error'] == "ValueError('boom')"
+
+
+@pytest.mark.asyncio
+async def test_daemon_stops_while_waiting(tmp_path):
+    runs = []
+
+    async def job(metrics):
+        runs.append('job')
+
+    status_path = tmp_path / 'status.json'
+    daemon = Daemon(logger, [Job('slow', 3600, job)], str(status_path))
+    task = asyncio.create_task(daemon.run())
+    await asyncio.sleep(0.05)
+    daemon.stop()
+    await asyncio.wait_for(task, 1)
+
+    assert runs == ['job']
+    assert json.loads(status_path.read_text())['stopping']
@@ -0,0 +1,64 @@
+import os
+import csv
+import gzip
+import pytest
+from datetime import datetime, timezone
+from tortoise import Tortoise
+
+from nyt_haiku import export
+from nyt_haiku.models import Article, Haiku
+
+
+async def make_tweeted_haikus(count):
+    articles = [await Article.create(url=f'http://nytimes.com/{i}', title=f'Title, "{i}"', byline='By A. Writer', section='us',
+                                     published_at=datetime(2021, 5, 1, i, tzinfo=timezone.utc), tags='a,b')
+                for i in range(3)]
+    for i in range(count):
+        await Haiku.create(hash=str(i), article=articles[i % 3], sentence=f's{i}', line0=f'line {i}', line1='b\nc', line2='d',
+                           tweet_id=str(1000 + i) if i % 4 else None, favorite_count=i,
+                           tweeted_at=datetime(2021, 6, 1, i % 24, tzinfo=timezone.utc) if i % 4 else None)
+
+
+async def expected_rows():
+    '''What publish_csv wrote when it built the rows from ORM objects'''
+    rows = [export.CSV_HEADERS]
+    for h in await Haiku.filter(tweet_id__not_isnull=True).order_by('id').prefetch_related('article'):
+        rows.append([str(value) if value is not None else '' for value in [
+            h.id, h.tweet_id, h.tweeted_at, h.line0, h.line1, h.line2, f"https://twitter.com/nythaikus/status/{h.tweet_id}",
+            h.favorite_count, h.retweet_count, h.quote_count, h.article.url, h.article.title,
+            h.article.byline, h.article.published_at, h.article.section, h.article.tags]])
+    return rows
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("filename", ['haiku.csv', 'haiku.csv.gz'])
+async def test_export_csv(db, tmp_path, filename):
+    await make_tweeted_haikus(11)
+    path = os.path.join(tmp_path, filename)
+    conn = Tortoise.get_connection("default")
+
+    assert await export.export_csv(conn, path, chunk_size=3) == 8
+    assert not os.path.exists(f'{path}.tmp')
+
+    opener = gzip.open if filename.endswith('.gz') else open
+    with opener(path, 'rt', encoding='utf-8', newline='') as file:
+        assert list(csv.reader(file)) == await expected_rows()
+
+
+@pytest.mark.asyncio
+async def test_failed_export_keeps_old_file(db, tmp_path, monkeypatch):
+    await make_tweeted_haikus(5)
+    path = os.path.join(tmp_path, 'haiku.csv')
+    with open(path, 'w') as file:
+        file.write('previous export')
+
+    def broken_row(row):
+        raise ValueError('bad row')
+
+    monkeypatch.setattr(export, 'csv_row', broken_row)
+    with pytest.raises(ValueError):
+        await export.export_csv(Tortoise.get_connection("default"), path)
+
+    assert not os.path.exists(f'{path}.tmp')
+    with open(path) as file:
+        assert file.read() == 'previous export'
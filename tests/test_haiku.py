@@ -1,9 +1,13 @@
+import os
 import pytest
+import logging
 import collections.abc
-import syllapy
 
-from nyt_haiku import haiku
+from nyt_haiku import haiku, nyt
 from nyt_haiku.haiku import HaikuFinder
+from nyt_haiku.errors import SyllableCountError
+
+logger = logging.getLogger(__name__)
 
 
 @pytest.fixture(scope="module")
@@ -27,6 +31,49 @@ def test_sentences_from_article(haiku_finder):
     assert len(sentences) == 0
 
 
+def test_unknown_segmenter():
+    with pytest.raises(ValueError):
+        HaikuFinder(segmenter='telepathy')
+
+
+def test_sentencizer_segmenter():
+    finder = HaikuFinder(segmenter='sentencizer')
+    sentences = finder.sentences_from_article("The cube was solved. Nobody expected it! Was it luck?")
+    assert sentences == ["The cube was solved.", "Nobody expected it!", "Was it luck?"]
+
+
+@pytest.mark.parametrize("sample", ["article.html", "live_blog.html"])
+def test_parser_segmenter_finds_same_haiku(haiku_finder, sample):
+    path = os.path.join(os.path.dirname(__file__), 'samples', sample)
+    with open(path) as file:
+        meta, body = nyt.parse_article(logger, 'http://nytimes.com/', file.read())
+
+    fast_finder = HaikuFinder(segmenter='parser')
+    assert fast_finder.find_haikus_in_article(body) == haiku_finder.find_haikus_in_article(body)
+
+
+def test_find_haiku(haiku_finder):
+    haiku = haiku_finder.find_haiku("An old silent pond — a frog jumps into the pond. Splash! Silence again.")
+    assert haiku["lines"] == ["An old silent pond", "— a frog jumps into the pond.", "Splash! Silence again."]
+    assert haiku["sentence"] == "An old silent pond — a frog jumps into the pond. Splash! Silence again."
+
+
+@pytest.mark.parametrize("sentence", [
+    "An old silent pond.",
+    "An old silent pond. A frog jumps into the pond. Splash! Silence again, and again.",
+    "An old silent pond. A frog jumps into the pond. Splash! Silence.",
+    "An ancient pond. A frog jumps into the pond. Splash! Silence again.",
+    "A frog jumps into the pond and sinks into the silence of the old pond forever after"])
+def test_find_haiku_mismatch(haiku_finder, sentence):
+    assert haiku_finder.find_haiku(sentence) is None
+
+
+def test_could_be_haiku():
+    assert not haiku.could_be_haiku("one two".split())
+    assert haiku.could_be_haiku("one — two three".split())
+    assert not haiku.could_be_haiku(("word " * 18).split())
+
+
 def test_terms_from_sentence(haiku_finder):
     sentence = "It was the puzzle’s creator — an unassuming architecture professor named Erno Rubik."
     terms = haiku_finder.terms_from_sentence(sentence)
@@ -81,9 +128,32 @@ def test_syllables_for_term(haiku_finder, term, expected):
     assert haiku_finder.syllables_for_term(term) == expected
 
 
+def test_syllable_cache(haiku_finder):
+    before = haiku_finder.syllable_cache_info()
+    assert haiku_finder.syllables_for_term("lighthouse") == haiku_finder.syllables_for_term("lighthouse")
+    after = haiku_finder.syllable_cache_info()
+    assert after.hits > before.hits
+    assert after.misses > before.misses
+
+
+def test_syllable_count_error_not_cached(monkeypatch):
+    finder = HaikuFinder(segmenter='sentencizer')
+
+    def broken_count(word):
+        raise RuntimeError("boom")
+
+    monkeypatch.setattr(finder.syllables, 'count', broken_count)
+    for _ in range(2):
+        with pytest.raises(SyllableCountError):
+            finder.syllables_for_term("lighthouse")
+
+    monkeypatch.undo()
+    assert finder.syllables_for_term("lighthouse") == 2
+
+
 @pytest.mark.parametrize("term,expected", [
     ("weren’t", 1)])
 def test_overrides_for_term(haiku_finder, term, expected):
     stripped_term = haiku.clean_term(term)
-    assert stripped_term in syllapy.WORD_DICT
+    assert stripped_term in haiku_finder.syllables
     assert haiku_finder.syllables_for_term(term) == expected
@@ -0,0 +1,98 @@
+import os
+import pytest
+from jinja2 import Environment, DictLoader
+from tortoise import Tortoise
+
+from nyt_haiku import leaderboard, migrations, twitter
+from nyt_haiku.models import Article, Haiku
+
+TEMPLATE = '{% for h in haikus %}{{ h.tweet_id }} {{ h.favorite_count + h.retweet_count + h.quote_count }}\n{% endfor %}'
+
+
+async def make_haikus(count):
+    article = await Article.create(url='http://nytimes.com/1', title='Title')
+    return [await Haiku.create(hash=str(i), article=article, sentence=f's{i}', line0='a', line1='b', line2='c')
+            for i in range(count)]
+
+
+async def assert_scores_match_counts():
+    conn = Tortoise.get_connection("default")
+    rows = await conn.execute_query_dict('SELECT "haiku_id", "score" FROM "haiku_score" ORDER BY "haiku_id"')
+    expected = [{'haiku_id': h.id, 'score': h.favorite_count + h.retweet_count + h.quote_count}
+                for h in await Haiku.filter(tweet_id__not_isnull=True).order_by('id')
+                if h.favorite_count + h.retweet_count + h.quote_count > 0]
+    assert rows == expected
+
+
+@pytest.mark.asyncio
+async def test_triggers_keep_scores(db):
+    haikus = await make_haikus(6)
+    for haiku in haikus[:4]:
+        haiku.tweet_id = str(haiku.id)
+        await haiku.save()
+    await assert_scores_match_counts()
+
+    haikus[0].favorite_count = 3
+    await haikus[0].save()
+    await Haiku.filter(id=haikus[1].id).update(quote_count=2)
+    await assert_scores_match_counts()
+
+    # a batched update like twitter.reconcile_timeline's
+    conn = Tortoise.get_connection("default")
+    await conn.execute_many(twitter.COUNTS_UPDATE, [(0, 0, haikus[0].id), (1, 4, haikus[2].id)])
+    await assert_scores_match_counts()
+
+    await Haiku.create(hash='new', article_id=haikus[0].article_id, sentence='s', line0='a', line1='b', line2='c',
+                       tweet_id='new', retweet_count=5)
+    await haikus[1].delete()
+    await Haiku.filter(id=haikus[2].id).update(tweet_id=None)
+    await assert_scores_match_counts()
+
+
+@pytest.mark.asyncio
+async def test_migration_fills_scores(db):
+    haikus = await make_haikus(4)
+    await Haiku.filter(id__in=[haikus[1].id, haikus[2].id]).update(tweet_id='1', favorite_count=2)
+
+    conn = Tortoise.get_connection("default")
+    await conn.execute_script('DROP TABLE "haiku_score"; PRAGMA user_version = 3')
+    await migrations.migrate()
+    await assert_scores_match_counts()
+
+
+@pytest.mark.asyncio
+async def test_publish_html_skips_unchanged(db, tmp_path):
+    haikus = await make_haikus(60)
+    for i, haiku in enumerate(haikus):
+        await Haiku.filter(id=haiku.id).update(tweet_id=str(1000 + i), favorite_count=i % 7, retweet_count=i % 3)
+
+    conn = Tortoise.get_connection("default")
+    top = await leaderboard.top_haikus(conn)
+    scores = [h['favorite_count'] + h['retweet_count'] + h['quote_count'] for h in top]
+    assert len(top) == leaderboard.LEADERBOARD_SIZE
+    assert scores == sorted(scores, reverse=True)
+    assert min(scores) > 0
+
+    path = os.path.join(tmp_path, 'index.html')
+    templates = {'index.html': TEMPLATE}
+    env = Environment(loader=DictLoader(templates))
+
+    assert await leaderboard.publish_html(conn, path, env)
+    with open(path) as file:
+        assert file.read().splitlines()[0] == f"{top[0]['tweet_id']} {scores[0]}"
+    assert not await leaderboard.publish_html(conn, path, env)
+
+    # outside the top 50, the page stays the same
+    await Haiku.filter(id=haikus[0].id).update(favorite_count=1)
+    assert not await leaderboard.publish_html(conn, path, env)
+
+    await Haiku.filter(id=haikus[0].id).update(favorite_count=100)
+    assert await leaderboard.publish_html(conn, path, env)
+    with open(path) as file:
+        assert file.read().startswith("1000 100\n")
+
+    templates['index.html'] = 'changed ' + TEMPLATE
+    assert await leaderboard.publish_html(conn, path, env)
+
+    os.remove(path)
+    assert await leaderboard.publish_html(conn, path, env)
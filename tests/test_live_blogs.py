@@ -0,0 +1,81 @@
+import logging
+import pytest
+from datetime import timedelta
+from tortoise import timezone
+
+from nyt_haiku import live_blogs
+from nyt_haiku.models import Article, LiveBlog
+
+logger = logging.getLogger(__name__)
+
+MINUTE = 60
+
+
+def test_schedule_backs_off_and_goes_quiet():
+    start = timezone.now()
+    live_blog = LiveBlog(poll_interval=live_blogs.POLL_INTERVAL)
+
+    def poll(minutes, posts):
+        return live_blogs.schedule(live_blog, posts, start + timedelta(minutes=minutes),
+                                   poll_interval=10 * MINUTE, max_poll_interval=40 * MINUTE, quiet_after=60 * MINUTE)
+
+    assert poll(0, {'1': 'a', '2': 'b'}) == 2
+    assert live_blog.next_poll_at == start + timedelta(minutes=10)
+
+    assert poll(10, {'1': 'a', '2': 'b'}) == 0
+    assert live_blog.next_poll_at == start + timedelta(minutes=30)
+    assert poll(30, {'1': 'a', '2': 'b'}) == 0
+    assert live_blog.next_poll_at == start + timedelta(minutes=70)
+
+    assert poll(40, {'1': 'a', '2': 'edited', '3': 'c'}) == 2
+    assert live_blog.changed_at == start + timedelta(minutes=40)
+    assert live_blog.next_poll_at == start + timedelta(minutes=50)
+    assert live_blogs.known_posts(live_blog) == {'1': 'a', '2': 'edited', '3': 'c'}
+
+    for minutes in [50, 70, 90]:
+        poll(minutes, {'1': 'a', '2': 'edited', '3': 'c'})
+        assert not live_blog.finished
+    assert live_blog.poll_interval == 40 * MINUTE
+
+    poll(100, {'1': 'a', '2': 'edited', '3': 'c'})
+    assert live_blog.finished
+
+
+@pytest.mark.asyncio
+async def test_update_and_due_live_blogs(db):
+    article = await Article.create(url='http://nytimes.com/live', parsed=True)
+    other = await Article.create(url='http://nytimes.com/other-live', parsed=True)
+    start = timezone.now()
+
+    assert live_blogs.known_posts(None) is None
+    await live_blogs.update_live_blog(logger, None, article, {'1': 'a'}, now=start)
+    await live_blogs.update_live_blog(logger, None, other, {'1': 'a'}, now=start)
+
+    assert await live_blogs.due_live_blogs(start) == []
+    due = await live_blogs.due_live_blogs(start + timedelta(seconds=live_blogs.POLL_INTERVAL))
+    assert [live_blog.article.url for live_blog in due] == [article.url, other.url]
+
+    live_blog = due[0]
+    assert live_blogs.known_posts(live_blog) == {'1': 'a'}
+    await live_blogs.update_live_blog(logger, live_blog, article, {'1': 'a', '2': 'b'}, now=live_blog.next_poll_at)
+    await live_blogs.update_live_blog(logger, due[1], other, None)
+
+    live_blog = await LiveBlog.get(article_id=article.id)
+    assert live_blogs.known_posts(live_blog) == {'1': 'a', '2': 'b'}
+    assert (await LiveBlog.get(article_id=other.id)).finished
+    assert await live_blogs.due_live_blogs(live_blog.next_poll_at) == [live_blog]
+
+
+@pytest.mark.asyncio
+async def test_poll_failed_backs_off_then_gives_up(db):
+    article = await Article.create(url='http://nytimes.com/live', parsed=True)
+    live_blog = await live_blogs.update_live_blog(logger, None, article, {'1': 'a'})
+    start = timezone.now()
+
+    for failures in range(1, 4):
+        await live_blogs.poll_failed(logger, live_blog, article, failures, now=start, max_failures=3)
+        assert live_blog.poll_interval == min(live_blogs.POLL_INTERVAL * 2 ** failures, live_blogs.MAX_POLL_INTERVAL)
+        assert live_blog.next_poll_at == start + timedelta(seconds=live_blog.poll_interval)
+        assert live_blog.finished == (failures == 3)
+
+    assert await live_blogs.due_live_blogs(start + timedelta(days=1)) == []
@@ -0,0 +1,91 @@
+import json
+import time
+import pickle
+import asyncio
+import logging
+import pytest
+
+from nyt_haiku.metrics import Metrics, LoopLagMonitor, NULL_METRICS, metric_name
+
+logger = logging.getLogger(__name__)
+
+
+def test_timer_and_merge():
+    metrics = Metrics()
+    with metrics.timer('parse'):
+        pass
+    metrics.count('articles')
+
+    worker_metrics = pickle.loads(pickle.dumps(metrics))
+    worker_metrics.observe('parse', 2.0)
+    worker_metrics.count('articles', 2)
+    metrics.merge(worker_metrics)
+
+    assert metrics.counters['articles'] == 4
+    assert metrics.timers['parse'].count == 3
+    assert metrics.timers['parse'].max == 2.0
+    assert metrics.summary()[0].startswith('parse: ')
+
+
+def test_null_metrics_records_nothing():
+    with NULL_METRICS.timer('parse'):
+        NULL_METRICS.count('articles')
+    NULL_METRICS.merge(Metrics())
+    assert NULL_METRICS.as_dict()['counters'] == {}
+    assert NULL_METRICS.as_dict()['timers'] == {}
+
+
+def test_timer_records_failures():
+    metrics = Metrics()
+    with pytest.raises(ValueError):
+        with metrics.timer('parse'):
+            raise ValueError()
+    assert metrics.timers['parse'].count == 1
+
+
+@pytest.mark.parametrize("name,expected", [
+    ('parse', 'parse'),
+    ('article fetch', 'article_fetch'),
+    ('Event loop lag', 'event_loop_lag'),
+])
+def test_metric_name(name, expected):
+    assert metric_name(name) == expected
+
+
+def test_export(tmp_path):
+    metrics = Metrics()
+    metrics.observe('article fetch', 0.5)
+    metrics.count('article bytes', 1024)
+
+    json_path = tmp_path / 'metrics.json'
+    metrics.export(str(json_path))
+    exported = json.loads(json_path.read_text())
+    assert exported['counters'] == {'article bytes': 1024}
+    assert exported['timers']['article fetch'] == {'count': 1, 'seconds': 0.5, 'max_seconds': 0.5}
+
+    prom_path = tmp_path / 'metrics.prom'
+    metrics.export(str(prom_path), 'prometheus')
+    lines = prom_path.read_text().splitlines()
+    assert 'nyt_haiku_article_bytes_total 1024' in lines
+    assert '# TYPE nyt_haiku_article_bytes_total counter' in lines
+    assert '# TYPE nyt_haiku_article_fetch_seconds_sum gauge' in lines
+    assert 'nyt_haiku_article_fetch_seconds_sum 0.5' in lines
+    assert 'nyt_haiku_article_fetch_seconds_count 1' in lines
+    assert sorted(tmp_path.iterdir()) == sorted([json_path, prom_path])
+
+    with pytest.raises(ValueError):
+        metrics.export(str(prom_path), 'xml')
+
+
+@pytest.mark.asyncio
+async def test_loop_lag_monitor():
+    metrics = Metrics()
+    monitor = LoopLagMonitor(logger, metrics, interval=0.01, threshold=0.05)
+    monitor.start()
+    await asyncio.sleep(0.02)
+    time.sleep(0.1)
+    await asyncio.sleep(0.02)
+    await monitor.stop()
+
+    assert metrics.counters['event loop blocked'] == 1
+    assert metrics.timers['event loop lag'].max >= 0.05
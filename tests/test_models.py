@@ -0,0 +1,49 @@
+import re
+import pytest
+from tortoise import Tortoise
+
+from nyt_haiku import models, migrations, candidates, tweet_stats, leaderboard
+from nyt_haiku.models import Article, Haiku, LiveBlog
+
+# A SCAN step in a query plan reads a whole table or index, SEARCH is a lookup
+FULL_SCAN = re.compile(r'^SCAN ')
+# Queries allowed to walk an index in order, which their LIMIT stops early, as long as nothing is sorted
+ORDERED_WALK = re.compile(r'^SCAN \w+ USING (COVERING )?INDEX ')
+ORDERED_WALKS = {'most popular'}
+
+# ORM queries are built lazily, they need the DB from the fixture
+QUERIES = {
+    'unparsed articles': lambda: Article.filter(parsed=False, id__gt=100).order_by('id').limit(100).sql(),
+    'haiku by article': lambda: Haiku.filter(article_id=1).sql(),
+    'haiku by tweet': lambda: Haiku.filter(tweet_id='1234').sql(),
+    'haiku by tweets': lambda: Haiku.filter(tweet_id__in=['1234', '5678']).sql(),
+    'tweeted haiku after id': lambda: tweet_stats.fetch_batch(100).sql(),
+    'tweet candidate pool size': lambda: candidates.POOL_SIZE_QUERY,
+    'tweet candidate by slot': lambda: candidates.CANDIDATE_QUERY.replace('?', '1'),
+    'articles cooling down': lambda: candidates.COOLDOWN_QUERY.replace('?', "'-2 hour'"),
+    'due live blogs': lambda: LiveBlog.filter(finished=False, next_poll_at__lte='2020-01-01 00:00:00').order_by('next_poll_at').sql(),
+    'recently tweeted': lambda: "select id from haiku where tweeted_at > datetime('now','-2 hour')",
+    'most popular': lambda: leaderboard.LEADERBOARD_QUERY.replace('?', '50'),
+}
+
+
+@pytest.mark.asyncio
+async def test_migrations_applied(db):
+    conn = Tortoise.get_connection("default")
+    assert await migrations.schema_version(conn) == len(migrations.MIGRATIONS)
+
+    # Running them again on an up to date database is a no-op
+    await models.setup_db()
+    assert await migrations.schema_version(conn) == len(migrations.MIGRATIONS)
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("name", QUERIES.keys())
+async def test_query_plan_uses_indexes(db, name):
+    conn = Tortoise.get_connection("default")
+    plan = await conn.execute_query_dict(f"EXPLAIN QUERY PLAN {QUERIES[name]()}")
+    scans = [step["detail"] for step in plan if FULL_SCAN.match(step["detail"])]
+    if name in ORDERED_WALKS:
+        assert not any('TEMP B-TREE' in step["detail"] for step in plan), plan
+        scans = [scan for scan in scans if not ORDERED_WALK.match(scan)]
+    assert not scans, plan
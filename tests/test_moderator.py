@@ -10,6 +10,10 @@ def mod():
 
 def test_sensitive_tags(mod):
     assert mod.is_sensitive_tag("Looting")
+    assert mod.is_sensitive_tag("Abu Ghraib (Iraq)")
+    assert not mod.is_sensitive_tag("Abu Ghraib")
+    assert not mod.is_sensitive_tag("looting")
+    assert not mod.is_sensitive_tag("Abu Ghraib, Iraq")
     assert not mod.is_sensitive_tag("Arts and Entertainment")
 
 
@@ -18,6 +22,43 @@ def test_sensitive_terms(mod):
     assert not mod.contains_sensitive_term("Area man given ice cream by friendly goose")
 
 
+@pytest.mark.parametrize('text,term', [
+    ("Area man murdered by angry goose", "murdered"),
+    ("The MURDER of crows", "murder"),
+    ("He had covid-19 last spring", "covid-19"),
+    ("He had covid last spring", "covid"),
+    ("She argued against the death penalty.", "death penalty"),
+    ("The victim’s family", "victim"),
+    ("The farmers were alarmed", None),
+    ("It had begun to snow in the industrial park", None),
+    ("Tomorrow is the deadline", None),
+    ("The penalty for death by chocolate", None),
+    ("Two guns were found", "guns"),
+    ("the murders continued", "murders"),
+    ("Shootings rose", "shootings"),
+    ("The town was evacuated", "evacuated"),
+    ("She was gunned down", "gunned"),
+    ("Both victims recovered", "victims"),
+    ("The rioters left", "rioters"),
+    ("A history of terrorism", "terrorism"),
+    ("An Israeli official said", "israeli"),
+    ("Israelis went to the polls", "israelis"),
+    ("The deadliest storm in years", "deadliest"),
+    ("The gunman fled", "gunman"),
+    ("Two gunmen were arrested", "gunmen"),
+    ("Gunfire rang out", "gunfire"),
+    ("A gunshot wound", "gunshot"),
+    ("A murderous plot", "murderous"),
+    ("The crowd was violently dispersed", "violently"),
+    ("He said he was victimized", "victimized"),
+    ("The data was weaponized", "weaponized"),
+    ("A shootout at dawn", "shootout"),
+    ("Arming the gate with a code", None),
+    ("The hostess smiled", None)])
+def test_sensitive_term_boundaries(mod, text, term):
+    assert mod.contains_sensitive_term(text) == term
+
+
 @pytest.mark.parametrize('text', [
     "My friend Dr. Watson",
     "Mr. Raffensperger responded quickly in a statement of his own.",
@@ -74,3 +115,34 @@ def test_is_awkward_text(mod, text):
     "It didn’t matter how big the pool was, if there was a pool I’d jump in."])
 def test_is_not_awkward(mod, text):
     assert not mod.is_awkward(text)
+
+
+def test_awkward_rule_stats():
+    mod = ArticleModerator()
+    assert mod.is_awkward("CAIRO - The sun?")
+    assert not mod.is_awkward("There are 43 lights.")
+
+    stats = {rule["name"]: rule for rule in mod.awkward_rule_stats()}
+    assert stats["capitals in a row"]["hits"] == 1
+    assert stats["NYT credit"]["calls"] == 1
+    assert sum(rule["hits"] for rule in stats.values()) == 1
+    assert all(rule["seconds"] >= 0 for rule in stats.values())
+
+    mod.reorder_awkward_rules()
+    assert mod.awkward_rule_stats()[0]["name"] == "capitals in a row"
+    assert mod.is_awkward("CAIRO - The sun?")
+    assert not mod.is_awkward("There are 43 lights.")
+
+
+def test_take_awkward_rule_stats():
+    mod = ArticleModerator()
+    assert mod.is_awkward("CAIRO - The sun?")
+    taken = {rule["name"]: rule for rule in mod.take_awkward_rule_stats()}
+    assert taken["capitals in a row"]["hits"] == 1
+    assert "NYT credit" not in taken
+
+    assert not mod.is_awkward("There are 43 lights.", prefiltered=True)
+    taken = {rule["name"]: rule for rule in mod.take_awkward_rule_stats()}
+    assert taken["NYT credit"]["calls"] == 1
+    assert "capitals in a row" not in taken
+    assert mod.take_awkward_rule_stats() == []
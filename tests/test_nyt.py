@@ -1,10 +1,23 @@
 import os
 import sys
+import asyncio
+import sqlite3
 import pytest
 from dateutil import parser
 import logging
+import hashlib
+from bs4 import BeautifulSoup, FeatureNotFound
+import aiohttp
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+from tortoise import timezone
 
-from nyt_haiku import nyt, haiku
+from nyt_haiku import nyt, haiku, workers, live_blogs
+from nyt_haiku.models import Article, ArticleError, Haiku, LiveBlog
+from nyt_haiku.hash_index import HaikuHashIndex
+from nyt_haiku.section_cache import SectionCache
+from nyt_haiku.haiku import HaikuFinder
+from nyt_haiku.metrics import Metrics
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.NOTSET)
@@ -15,14 +28,26 @@ def test_normalize_url():
     assert nyt.normalize_url('http://www.foo.com/bar?baz=quux') == "http://www.foo.com/bar"
 
 
-def test_parse_article():
+def html_parsers():
+    parsers = []
+    for name, settings in nyt.HTML_PARSERS.items():
+        try:
+            BeautifulSoup('', **settings)
+            parsers.append(name)
+        except FeatureNotFound:
+            pass
+    return parsers
+
+
+@pytest.mark.parametrize("html_parser", html_parsers())
+def test_parse_article(html_parser):
     path = os.path.join(os.path.dirname(__file__), 'samples', 'article.html')
     html = ''
 
     with open(path) as file:
         html = file.read()
 
-    meta, body = nyt.parse_article(logger, 'http://nytimes.com/', html)
+    meta, body = nyt.parse_article(logger, 'http://nytimes.com/', html, html_parser=html_parser)
 
     assert body is not None
     assert not meta['sensitive']
@@ -34,18 +59,20 @@ def test_parse_article():
     assert meta['description'] == 'It’s a renter’s market. Here are some tips to help you take advantage of your power as a tenant.'
     assert meta['keywords'] == 'Real Estate, Housing,Rent,Landlord,Service Content,Shelter-in-Place (Lifestyle);Social Distancing,Brooklyn,Manhattan,Queens'
     assert meta['section'] == 'Real Estate'
+    assert meta['live_blog_posts'] is None
     assert meta['tags'] == 'Real Estate and Housing (Residential);Renting and Leasing (Real Estate);Landlords;Content Type: Service;Quarantine (Life and Culture);Brooklyn (NYC);Manhattan (NYC);Queens (NYC)'
 
 
 
-def test_parse_blog():
+@pytest.mark.parametrize("html_parser", html_parsers())
+def test_parse_blog(html_parser):
     path = os.path.join(os.path.dirname(__file__), 'samples', 'live_blog.html')
     html = ''
 
     with open(path) as file:
         html = file.read()
 
-    meta, body = nyt.parse_article(logger, 'http://nytimes.com/', html)
+    meta, body = nyt.parse_article(logger, 'http://nytimes.com/', html, html_parser=html_parser)
 
     assert body is not None
     assert not meta['sensitive']
@@ -57,3 +84,274 @@ def test_parse_blog():
     assert meta['description'] == ''
     assert meta['keywords'] == 'null'
     assert meta['section'] == 'Business'
+
+
+def test_parse_blog_known_posts():
+    with open(os.path.join(os.path.dirname(__file__), 'samples', 'live_blog.html')) as file:
+        html = file.read()
+
+    meta, body = nyt.parse_article(logger, 'http://nytimes.com/', html)
+    posts = meta['live_blog_posts']
+    assert len(posts) > 1
+    assert all(post_id.isdigit() for post_id in posts)
+
+    meta, unchanged_body = nyt.parse_article(logger, 'http://nytimes.com/', html, known_posts=posts)
+    assert meta['live_blog_posts'] == posts
+    assert unchanged_body == ''
+
+    first_post = next(iter(posts))
+    known_posts = dict(posts, **{first_post: 'edited'})
+    meta, changed_body = nyt.parse_article(logger, 'http://nytimes.com/', html, known_posts=known_posts)
+    assert changed_body
+    assert body.startswith(changed_body)
+    assert len(changed_body) < len(body)
+
+
+@pytest.mark.parametrize("html_parser", html_parsers())
+def test_parsers_agree(html_parser):
+    for sample in ['article.html', 'live_blog.html']:
+        with open(os.path.join(os.path.dirname(__file__), 'samples', sample)) as file:
+            html = file.read()
+
+        assert nyt.parse_article(logger, sample, html, html_parser=html_parser) == nyt.parse_article(logger, sample, html)
+
+
+def unwrapped_sample(sample):
+    '''The sample with its article tags turned into divs, as on templates without an article wrapper'''
+    with open(os.path.join(os.path.dirname(__file__), 'samples', sample)) as file:
+        return file.read().replace('<article', '<div').replace('</article>', '</div>')
+
+
+@pytest.mark.parametrize("html_parser", html_parsers())
+def test_parse_live_blog_outside_article(html_parser):
+    html = unwrapped_sample('live_blog.html')
+    meta, body = nyt.parse_article(logger, 'http://nytimes.com/', html, html_parser=html_parser)
+
+    assert len(meta['live_blog_posts']) == 9
+    assert body
+    assert (meta, body) == nyt.parse_article(logger, 'http://nytimes.com/', html)
+
+
+@pytest.mark.parametrize("html_parser", html_parsers())
+def test_parse_article_without_wrapper(html_parser):
+    html = unwrapped_sample('article.html')
+    meta, body = nyt.parse_article(logger, 'http://nytimes.com/', html, html_parser=html_parser)
+
+    assert meta['live_blog_posts'] is None
+    assert 'landlord' in body
+    assert (meta, body) == nyt.parse_article(logger, 'http://nytimes.com/', html)
+
+
+def test_paragraph_strings():
+    soup = BeautifulSoup('<p>One <!-- hidden --><em>two</em><br/>three</p><p>Four</p>', 'html.parser')
+    assert ''.join(nyt.paragraph_strings(soup.find_all('p'))) == 'One two \n three\nFour\n'
+
+
+@pytest.mark.asyncio
+async def test_unparsed_articles(db):
+    for i in range(7):
+        await Article.create(url=f'https://www.nytimes.com/2021/01/0{i}/story.html', parsed=(i == 3))
+
+    articles = [a async for a in nyt.unparsed_articles(batch_size=2)]
+    assert [a.url[-16:-11] for a in articles] == ['01/00', '01/01', '01/02', '01/04', '01/05', '01/06']
+
+    articles = [a async for a in nyt.unparsed_articles(batch_size=2, max_articles=3)]
+    assert len(articles) == 3
+
+
+@pytest.mark.asyncio
+async def test_failing_articles_are_given_up_on(db):
+    async def oversized(request):
+        return web.Response(text='x' * 2048, content_type='text/html')
+
+    app = web.Application()
+    app.router.add_get('/', oversized)
+    async with TestServer(app) as server, aiohttp.ClientSession() as session:
+        failing = await Article.create(url=str(server.make_url('/')))
+        for attempt in range(nyt.MAX_ARTICLE_ATTEMPTS):
+            assert [a.id async for a in nyt.unparsed_articles(max_articles=1)] == [failing.id]
+            await nyt.fetch_articles(session, logger, workers.InlineArticleProcessor(logger), hash_index=HaikuHashIndex(), max_articles=1, max_bytes=1024)
+
+    error = await ArticleError.get(article_id=failing.id)
+    assert error.attempts == nyt.MAX_ARTICLE_ATTEMPTS
+    assert 'ArticleTooLargeError' in error.last_error
+    assert (await Article.get(id=failing.id)).parsed
+    assert [a async for a in nyt.unparsed_articles()] == []
+
+
+@pytest.mark.asyncio
+async def test_failing_live_blog_polls_back_off(db):
+    async def not_found(request):
+        return web.Response(status=404, text='<html><body>Not Found</body></html>', content_type='text/html')
+
+    app = web.Application()
+    app.router.add_get('/', not_found)
+    async with TestServer(app) as server, aiohttp.ClientSession() as session:
+        article = await Article.create(url=str(server.make_url('/')), parsed=True)
+        await live_blogs.update_live_blog(logger, None, article, {'1': 'a'})
+
+        for failures in range(1, live_blogs.MAX_POLL_FAILURES + 1):
+            # every poll is due, as if the back off had passed
+            await LiveBlog.filter(article_id=article.id).update(next_poll_at=timezone.now())
+            await nyt.fetch_articles(session, logger, workers.InlineArticleProcessor(logger), hash_index=HaikuHashIndex())
+
+            live_blog = await LiveBlog.get(article_id=article.id)
+            assert live_blog.next_poll_at > timezone.now()
+            assert (await ArticleError.get(article_id=article.id)).attempts == failures
+
+    assert live_blog.finished
+    assert await live_blogs.due_live_blogs() == []
+
+
+@pytest.mark.asyncio
+async def test_fetch_articles_stops_workers_on_error(monkeypatch):
+    async def broken_backlog(batch_size, max_articles):
+        raise ConnectionError('database is locked')
+        yield
+
+    monkeypatch.setattr(nyt, 'unparsed_articles', broken_backlog)
+    tasks_before = asyncio.all_tasks()
+    with pytest.raises(ConnectionError):
+        await nyt.fetch_articles(None, logger, workers.InlineArticleProcessor(logger), hash_index=HaikuHashIndex(), concurrency=3)
+    assert asyncio.all_tasks() == tasks_before
+
+
+@pytest.mark.asyncio
+async def test_save_new_urls(db):
+    await Article.create(url='https://www.nytimes.com/2021/01/01/known.html', parsed=True)
+
+    urls = {f'https://www.nytimes.com/2021/01/01/story{i}.html' for i in range(nyt.URL_CHUNK_SIZE + 5)}
+    urls.add('https://www.nytimes.com/2021/01/01/known.html')
+
+    assert await nyt.save_new_urls(logger, urls) == nyt.URL_CHUNK_SIZE + 5
+    assert await Article.all().count() == nyt.URL_CHUNK_SIZE + 6
+    assert await nyt.save_new_urls(logger, urls) == 0
+
+    article = await Article.get(url='https://www.nytimes.com/2021/01/01/story0.html')
+    assert not article.parsed
+    assert not article.sensitive
+    assert article.created_at is not None
+
+
+def haiku_dict(sentence):
+    return {"lines": [sentence, "line two", "line three"], "sentence": sentence, "hash": hashlib.md5(sentence.encode('utf-8')).hexdigest()}
+
+
+@pytest.mark.asyncio
+async def test_save_article(db):
+    article = await Article.create(url='https://www.nytimes.com/2021/01/01/story.html')
+    other = await Article.create(url='https://www.nytimes.com/2021/01/01/other.html')
+    await Haiku.create(article_id=other.id, line0='a', line1='b', line2='c', **{k: v for k, v in haiku_dict("Saved elsewhere").items() if k != 'lines'})
+
+    # Saved by another process after the index was loaded
+    hash_index = HaikuHashIndex()
+    hash_index.add(haiku_dict("Already known").get("hash"))
+
+    article.parsed = True
+    haikus = [haiku_dict("Already known"), haiku_dict("Brand new"), haiku_dict("Brand new"), haiku_dict("Saved elsewhere")]
+    assert await nyt.save_article(logger, hash_index, article, haikus) == 1
+
+    assert await Haiku.filter(article_id=article.id).values_list('sentence', flat=True) == ["Brand new"]
+    assert (await Article.get(id=article.id)).parsed
+    assert haiku_dict("Brand new")["hash"] in hash_index
+    assert len(await HaikuHashIndex.load()) == 2
+
+
+@pytest.mark.asyncio
+async def test_save_article_failure_keeps_hashes_new(db, monkeypatch):
+    article = await Article.create(url='https://www.nytimes.com/2021/01/01/story.html')
+    hash_index = HaikuHashIndex()
+
+    async def broken_write(article, haikus):
+        raise sqlite3.OperationalError('database is locked')
+
+    monkeypatch.setattr(nyt, 'write_article', broken_write)
+    with pytest.raises(sqlite3.OperationalError):
+        await nyt.save_article(logger, hash_index, article, [haiku_dict("Brand new")])
+    assert len(hash_index) == 0
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("content_type,body,expected", [
+    ('text/html; charset=utf-8', 'caf\u00e9'.encode('utf-8'), 'caf\u00e9'),
+    ('text/html; charset=iso-8859-1', 'caf\u00e9'.encode('latin-1'), 'caf\u00e9'),
+    ('text/html', 'caf\u00e9'.encode('utf-8'), 'caf\u00e9'),
+    ('text/html; charset=not-a-charset', b'plain', 'plain'),
+])
+async def test_read_text(content_type, body, expected):
+    async def page(request):
+        return web.Response(body=body, headers={'Content-Type': content_type})
+
+    app = web.Application()
+    app.router.add_get('/', page)
+    async with TestServer(app) as server, aiohttp.ClientSession() as session:
+        async with session.get(str(server.make_url('/'))) as response:
+            assert await nyt.read_text(response, 1024) == expected
+
+
+SECTION_PAGE = '<html><body><a href="https://www.nytimes.com/2021/01/01/story.html?src=hp">Story</a><a href="/about">About</a>{}</body></html>'
+
+
+@pytest.mark.asyncio
+async def test_fetch_section_urls_cached(tmp_path):
+    pages = {'body': SECTION_PAGE.format('')}
+
+    async def section(request):
+        etag = '"' + str(len(pages['body'])) + '"'
+        if request.headers.get('If-None-Match') == etag:
+            return web.Response(status=304)
+        return web.Response(text=pages['body'], content_type='text/html', headers={'ETag': etag})
+
+    app = web.Application()
+    app.router.add_get('/', section)
+    cache_path = os.path.join(tmp_path, 'sections.json')
+
+    async with TestServer(app) as server, aiohttp.ClientSession() as session:
+        section_url = str(server.make_url('/'))
+        cache = SectionCache(cache_path)
+        assert await nyt.fetch_section_urls(session, logger, section_url, cache) == {'https://www.nytimes.com/2021/01/01/story.html'}
+        cache.save()
+
+        cache = SectionCache(cache_path)
+        assert await nyt.fetch_section_urls(session, logger, section_url, cache) == set()
+
+        # New markup but the same links
+        pages['body'] = SECTION_PAGE.format('<p>Updated</p>')
+        assert await nyt.fetch_section_urls(session, logger, section_url, cache) == set()
+        cache.save()
+
+        pages['body'] = SECTION_PAGE.format('<a href="https://www.nytimes.com/2021/01/02/new.html">New</a>')
+        assert await nyt.fetch_section_urls(session, logger, section_url, cache) == {'https://www.nytimes.com/2021/01/01/story.html', 'https://www.nytimes.com/2021/01/02/new.html'}
+
+        assert cache.stats == {'not modified': 1, 'same links': 1, 'changed': 1}
+
+
+def test_prefilter_finds_same_haiku():
+    haiku_finder = HaikuFinder()
+    body = ("An old silent pond, a frog jumps into the pond, splash, silence again. "
+            "An old silent pond, a frog jumps into the pond, he said quietly. "
+            "CAIRO is a city on the Nile with a great many ponds and frogs. "
+            "An old silent pond, a frog jumps into the pond, as Dr. Frog said.\n")
+
+    for sample in ['article.html', 'live_blog.html']:
+        with open(os.path.join(os.path.dirname(__file__), 'samples', sample)) as file:
+            meta, sample_body = nyt.parse_article(logger, sample, file.read())
+        body += sample_body
+
+    metrics, prefiltered_metrics = Metrics(), Metrics()
+    haikus, stats = nyt.find_article_haikus(logger, haiku_finder, body, metrics=metrics)
+    prefiltered_haikus, prefiltered_stats = nyt.find_article_haikus(logger, haiku_finder, body, prefilter=True, metrics=prefiltered_metrics)
+
+    assert [h["sentence"] for h in haikus] == ["An old silent pond, a frog jumps into the pond, splash, silence again."]
+    assert prefiltered_haikus == haikus
+    assert prefiltered_stats['prefiltered'] > 0
+    assert prefiltered_stats['sentences'] == stats['sentences']
+    assert prefiltered_stats['not haiku'] + prefiltered_stats['moderated'] + prefiltered_stats['prefiltered'] == stats['not haiku'] + stats['moderated']
+
+    # The prefilter rules run once per sentence, not again in is_awkward
+    calls = nyt.AWKWARD_RULE_METRIC.format('capitals in a row') + ' calls'
+    assert 0 < metrics.counters[calls] <= stats['haiku'] + stats['moderated']
+    assert prefiltered_metrics.counters[calls] == prefiltered_stats['sentences']
+    hits = nyt.AWKWARD_RULE_METRIC.format('capitals in a row') + ' hits'
+    assert prefiltered_metrics.counters[hits] >= 1
+    assert 'capitals in a row' in nyt.awkward_rule_summary(prefiltered_metrics)
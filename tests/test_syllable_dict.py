@@ -0,0 +1,88 @@
+import os
+import pytest
+import syllapy
+
+from nyt_haiku import syllable_dict
+
+
+@pytest.fixture(scope="module")
+def merged_words():
+    words = dict(syllapy.WORD_DICT)
+    words.update(syllable_dict.read_overrides())
+    return words
+
+
+@pytest.fixture
+def csv_path(tmp_path):
+    path = tmp_path / 'syllable_counts.csv'
+    path.write_text('Lighthouse,3\nnewword,4\n')
+    return str(path)
+
+
+def test_matches_syllapy_with_overrides(tmp_path, merged_words, monkeypatch):
+    path = str(tmp_path / 'syllables.bin')
+    syllable_dict.build(path)
+    dictionary = syllable_dict.SyllableDictionary(path)
+
+    assert len(dictionary) == len(merged_words)
+    for word, count in merged_words.items():
+        assert dictionary.lookup(word) == count
+
+    monkeypatch.setattr(syllapy, 'WORD_DICT', merged_words)
+    for word in ['lighthouse', 'weren’t', 'debates', 'Rubik.', 'zzyzx', 'table', 'eerie', 'covid-19', '', '...', 'aardvark', 'zygote']:
+        assert dictionary.count(word) == syllapy.count(word), word
+
+    assert dictionary.lookup('notaword') is None
+    assert 'notaword' not in dictionary
+
+
+def test_load_rebuilds_when_csv_changes(tmp_path, csv_path):
+    path = str(tmp_path / 'syllables.bin')
+    dictionary = syllable_dict.load(path, csv_path)
+    assert dictionary.lookup('lighthouse') == 3
+    assert dictionary.lookup('newword') == 4
+    built_at = os.stat(path).st_mtime_ns
+
+    assert syllable_dict.load(path, csv_path).digest == dictionary.digest
+    assert os.stat(path).st_mtime_ns == built_at
+
+    with open(csv_path, 'a') as file:
+        file.write('otherword,2\n')
+    rebuilt = syllable_dict.load(path, csv_path)
+    assert rebuilt.digest != dictionary.digest
+    assert rebuilt.lookup('otherword') == 2
+
+
+def test_load_replaces_bad_file(tmp_path, csv_path):
+    path = tmp_path / 'syllables.bin'
+    path.write_bytes(b'not a dictionary')
+    assert syllable_dict.load(str(path), csv_path).lookup('newword') == 4
+
+
+def test_syllapy_only(tmp_path):
+    path = str(tmp_path / 'syllables.bin')
+    syllable_dict.build(path, csv_path=None)
+    dictionary = syllable_dict.SyllableDictionary(path)
+    assert len(dictionary) == len(syllapy.WORD_DICT)
+
+
+def test_default_path(tmp_path, monkeypatch):
+    monkeypatch.delenv('SYLLABLE_DICT_PATH', raising=False)
+    monkeypatch.setenv('XDG_CACHE_HOME', str(tmp_path))
+    assert syllable_dict.default_path() == str(tmp_path / 'nyt_haiku' / 'syllables.bin')
+
+    monkeypatch.setenv('SYLLABLE_DICT_PATH', str(tmp_path / 'other.bin'))
+    assert syllable_dict.default_path() == str(tmp_path / 'other.bin')
+
+
+def test_load_unwritable_path(tmp_path, csv_path):
+    # a file where the cache directory should be, so nothing can be written under it
+    blocker = tmp_path / 'cache'
+    blocker.write_text('')
+    path = str(blocker / 'syllables.bin')
+
+    dictionary = syllable_dict.load(path, csv_path)
+    assert dictionary.lookup('newword') == 4
+    assert dictionary.count('lighthouse') == 3
+    assert sorted(os.listdir(tmp_path)) == ['cache', 'syllable_counts.csv']
+    dictionary.close()
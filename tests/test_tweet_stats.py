@@ -0,0 +1,142 @@
+import os
+import asyncio
+import logging
+import pytest
+from peony.data_processing import PeonyResponse
+from peony.exceptions import HTTPTooManyRequests
+
+from nyt_haiku import tweet_stats
+from nyt_haiku.metrics import Metrics
+from nyt_haiku.models import Article, Haiku
+
+logger = logging.getLogger(__name__)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+        self.sleeps = []
+
+    def __call__(self):
+        return self.now
+
+    async def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+def tweets_response(tweet_ids, headers=None):
+    '''A stand-in for the v2 tweets lookup response, where every tweet has one like per character of its id'''
+    data = {'data': [{'id': tweet_id, 'public_metrics': {'like_count': len(tweet_id), 'retweet_count': 1, 'quote_count': 0}}
+                     for tweet_id in tweet_ids]}
+    return PeonyResponse(data=data, headers=headers or {}, url='https://api.twitter.com/2/tweets', request={})
+
+
+@pytest.mark.asyncio
+async def test_token_bucket():
+    clock = FakeClock()
+    bucket = tweet_stats.TokenBucket(rate=0.5, capacity=2, clock=clock, sleep=clock.sleep)
+
+    await bucket.acquire()
+    await bucket.acquire()
+    assert clock.sleeps == []
+    await bucket.acquire()
+    assert clock.sleeps == [2.0]
+
+    # the server says the window is used up until the reset time
+    bucket.update({'X-Rate-Limit-Remaining': '0', 'X-Rate-Limit-Reset': str(int(clock.now) + 60)})
+    await bucket.acquire()
+    assert clock.sleeps[1] == 60
+    assert clock.now >= 1062
+
+    bucket.update({})
+    bucket.update({'x-rate-limit-remaining': '1'})
+    assert bucket.tokens <= 1
+
+
+def test_checkpoint(tmp_path):
+    path = os.path.join(tmp_path, 'stats.json')
+    checkpoint = tweet_stats.Checkpoint.load(path)
+    assert checkpoint.last_id == 0
+
+    first, second, third = checkpoint.start(10), checkpoint.start(20), checkpoint.start(30)
+    checkpoint.finish(second)
+    assert checkpoint.last_id == 0
+    checkpoint.finish(first)
+    assert checkpoint.last_id == 20
+    assert tweet_stats.Checkpoint.load(path).last_id == 20
+
+    fourth = checkpoint.start(40)
+    checkpoint.finish(third, ok=False)
+    checkpoint.finish(fourth)
+    assert checkpoint.stalled
+    assert tweet_stats.Checkpoint.load(path).last_id == 20
+
+    checkpoint.clear()
+    assert not os.path.exists(path)
+
+
+@pytest.mark.asyncio
+async def test_refresh_stats(db, tmp_path, monkeypatch):
+    monkeypatch.setattr(tweet_stats, 'MAX_ATTEMPTS', 2)
+    article = await Article.create(url='http://nytimes.com/1')
+    for i in range(25):
+        await Haiku.create(hash=str(i), article=article, sentence=f's{i}', line0='a', line1='b', line2='c',
+                           tweet_id=str(10 ** (i % 5)) + str(i) if i % 7 else None)
+    tweeted = await Haiku.filter(tweet_id__not_isnull=True).order_by('id')
+
+    calls = []
+    rate_limited = [True]
+    broken = {tweeted[9].tweet_id}
+
+    async def lookup(tweet_ids):
+        calls.append(tweet_ids)
+        if rate_limited:
+            rate_limited.pop()
+            raise HTTPTooManyRequests(response=tweets_response([], {'x-rate-limit-remaining': '0', 'x-rate-limit-reset': '0'}))
+        if broken.intersection(tweet_ids):
+            raise ConnectionError('timeline unreachable')
+        return tweets_response(tweet_ids, {'x-rate-limit-remaining': '100'})
+
+    path = os.path.join(tmp_path, 'stats.json')
+    bucket = tweet_stats.TokenBucket(rate=1000, capacity=1000)
+    metrics = Metrics()
+
+    checkpoint = tweet_stats.Checkpoint.load(path)
+    assert not await tweet_stats.refresh_stats(logger, lookup, bucket, checkpoint, batch_size=4, concurrency=3, metrics=metrics)
+    assert checkpoint.last_id == tweeted[7].id
+    assert metrics.counters['stats rate limited'] == 1
+    assert metrics.counters['stats errors'] == 2
+    assert metrics.counters['stats batches'] == 5
+    assert all(len(ids) <= 4 for ids in calls)
+
+    broken.clear()
+    calls.clear()
+    checkpoint = tweet_stats.Checkpoint.load(path)
+    assert checkpoint.last_id == tweeted[7].id
+    assert await tweet_stats.refresh_stats(logger, lookup, bucket, checkpoint, batch_size=4, concurrency=3)
+    assert sorted(sum(calls, [])) == sorted(h.tweet_id for h in tweeted[8:])
+
+    for haiku in await Haiku.all():
+        if haiku.tweet_id:
+            assert (haiku.favorite_count, haiku.retweet_count, haiku.quote_count) == (len(haiku.tweet_id), 1, 0)
+        else:
+            assert (haiku.favorite_count, haiku.retweet_count) == (0, 0)
+
+
+@pytest.mark.asyncio
+async def test_refresh_stats_checkpoint_save_fails(db, tmp_path):
+    article = await Article.create(url='http://nytimes.com/1')
+    for i in range(12):
+        await Haiku.create(hash=str(i), article=article, sentence=f's{i}', line0='a', line1='b', line2='c', tweet_id=str(100 + i))
+
+    async def lookup(tweet_ids):
+        return tweets_response(tweet_ids)
+
+    # the checkpoint directory is missing, so every save raises
+    checkpoint = tweet_stats.Checkpoint(os.path.join(tmp_path, 'missing', 'stats.json'))
+    bucket = tweet_stats.TokenBucket(rate=1000, capacity=1000)
+    await asyncio.wait_for(tweet_stats.refresh_stats(logger, lookup, bucket, checkpoint, batch_size=2, concurrency=2), timeout=10)
+
+    for haiku in await Haiku.all():
+        assert haiku.favorite_count == len(haiku.tweet_id)
@@ -0,0 +1,38 @@
+import logging
+import pytest
+
+from nyt_haiku import twitter
+from nyt_haiku.metrics import Metrics
+from nyt_haiku.models import Article, Haiku
+
+logger = logging.getLogger(__name__)
+
+
+def timeline_tweet(tweet_id, favorite_count, retweet_count):
+    '''The fields of a user_timeline entry that reconcile_timeline reads'''
+    return {'id_str': tweet_id, 'favorite_count': favorite_count, 'retweet_count': retweet_count, 'text': 'a\nb\nc'}
+
+
+@pytest.mark.asyncio
+async def test_reconcile_timeline(db):
+    article = await Article.create(url='http://nytimes.com/1')
+    for i, counts in enumerate([(0, 0), (3, 1), (5, 2), (7, 0)]):
+        await Haiku.create(hash=str(i), article=article, sentence=f's{i}', line0='a', line1='b', line2='c',
+                           tweet_id=f'10{i}', favorite_count=counts[0], retweet_count=counts[1])
+
+    timeline = [
+        timeline_tweet('100', 1, 0),    # first counts
+        timeline_tweet('101', 4, 1),    # more faves
+        timeline_tweet('102', 5, 2),    # unchanged
+        timeline_tweet('103', 6, 0),    # fewer, kept as they are
+        timeline_tweet('999', 9, 9),    # not a haiku
+    ]
+    metrics = Metrics()
+    assert await twitter.reconcile_timeline(logger, timeline, metrics) == 2
+    assert metrics.counters['tweet counts changed'] == 2
+
+    counts = await Haiku.all().order_by('tweet_id').values_list('tweet_id', 'favorite_count', 'retweet_count')
+    assert counts == [('100', 1, 0), ('101', 4, 1), ('102', 5, 2), ('103', 7, 0)]
+
+    assert await twitter.reconcile_timeline(logger, timeline) == 0
+    assert await twitter.reconcile_timeline(logger, []) == 0
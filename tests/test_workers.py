@@ -0,0 +1,75 @@
+import os
+import sys
+import asyncio
+import threading
+import subprocess
+import pytest
+import logging
+
+from nyt_haiku import nyt, workers
+from nyt_haiku.haiku import HaikuFinder
+from nyt_haiku.metrics import Metrics
+
+logger = logging.getLogger(__name__)
+
+
+def test_pool_size():
+    assert workers.pool_size(None) == 0
+    assert workers.pool_size("") == 0
+    assert workers.pool_size("3") == 3
+    assert workers.pool_size("auto") == (os.cpu_count() or 1)
+
+
+@pytest.mark.asyncio
+async def test_pool_matches_inline():
+    path = os.path.join(os.path.dirname(__file__), 'samples', 'article.html')
+    with open(path) as file:
+        html = file.read()
+
+    inline = workers.InlineArticleProcessor(logger, HaikuFinder(segmenter='parser'))
+    pool = workers.PoolArticleProcessor(1, segmenter='parser')
+    pool_metrics = Metrics()
+    inline_metrics = Metrics()
+    try:
+        assert await pool.process('http://nytimes.com/', html, pool_metrics) == await inline.process('http://nytimes.com/', html, inline_metrics)
+    finally:
+        pool.close()
+
+    assert pool.stats == inline.stats
+    assert pool_metrics.timers.keys() == inline_metrics.timers.keys()
+    assert pool_metrics.timers['parse'].count == 1
+
+
+@pytest.mark.asyncio
+async def test_inline_loads_finder_once_off_the_loop(monkeypatch):
+    built = []
+
+    class FakeFinder:
+        def __init__(self, segmenter):
+            built.append((segmenter, threading.current_thread()))
+
+    monkeypatch.setattr(workers, 'HaikuFinder', FakeFinder)
+    inline = workers.InlineArticleProcessor(logger, segmenter='parser')
+    first, second = await asyncio.gather(inline.load_haiku_finder(), inline.load_haiku_finder())
+
+    assert first is second
+    assert len(built) == 1
+    assert built[0][0] == 'parser'
+    assert built[0][1] is not threading.current_thread()
+
+
+
+def test_init_worker_preloads_moderator(monkeypatch):
+    for name in ('WORKER_HAIKU_FINDER', 'WORKER_HTML_PARSER', 'WORKER_PREFILTER'):
+        monkeypatch.setattr(workers, name, getattr(workers, name))
+    nyt.article_moderator.cache_clear()
+
+    workers.init_worker('parser', nyt.DEFAULT_HTML_PARSER, False)
+    assert nyt.article_moderator.cache_info().currsize == 1
+
+def test_imports_are_lazy():
+    # Scripts that only touch the database shouldn't pay for spaCy, num2words or peony
+    code = "import sys, nyt_haiku.workers, nyt_haiku.twitter; print(sorted(m for m in ('spacy', 'num2words', 'peony') if m in sys.modules))"
+    result = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True,
+                            cwd=os.path.join(os.path.dirname(__file__), '..'))
+    assert result.stdout.strip() == '[]'